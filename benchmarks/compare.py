@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# Compares two result files of benchmarks/run.py stage by stage and exits
+# with 1 if any stage got slower than the threshold:
+#
+#   python benchmarks/compare.py before.json after.json [--threshold 10]
+
+import sys
+import json
+import optparse
+
+def load(name):
+    with open(name, 'r') as f:
+        report = json.load(f)
+    return report, dict((result['case'], result) for result in report['results'])
+
+def main():
+    parser = optparse.OptionParser(usage='%prog [options] BEFORE.json AFTER.json')
+    parser.add_option('--threshold', type='float', dest='threshold', default=10.0,
+            help='slowdown in percent reported as regression (default: %default)')
+    parser.add_option('--min-time', type='float', dest='min_time', default=1.0,
+            help='ignore stages faster than this many milliseconds (default: %default)')
+    (options, args) = parser.parse_args()
+    if len(args) != 2:
+        parser.error('two result files needed')
+
+    (before, old), (after, new) = load(args[0]), load(args[1])
+    sys.stdout.write('%s -> %s\n' % (before.get('commit') or args[0], after.get('commit') or args[1]))
+    if before.get('stubbed') != after.get('stubbed') or before.get('tools') != after.get('tools'):
+        sys.stdout.write('warning: external tools differ, layout and rasterize times are not comparable\n')
+
+    regressions = 0
+    for case in sorted(set(old) & set(new), key=lambda case: (old[case]['kind'], old[case]['size'], case)):
+        rows = [('total', old[case]['wall'], new[case]['wall'])]
+        for stage in sorted(set(old[case]['stages']) & set(new[case]['stages'])):
+            rows.append((stage, old[case]['stages'][stage]['wall'], new[case]['stages'][stage]['wall']))
+        for stage, a, b in rows:
+            if max(a, b) * 1000 < options.min_time:
+                continue
+            change = (b - a) * 100.0 / a if a else 0.0
+            mark = ''
+            if change > options.threshold:
+                mark = '  REGRESSION'
+                regressions += 1
+            sys.stdout.write('%-24s %-10s %10.2f %10.2f ms %+7.1f%%%s\n' % (case, stage, a * 1000, b * 1000, change, mark))
+
+    for case in sorted(set(old) ^ set(new)):
+        sys.stdout.write('%-24s only in %s\n' % (case, args[0] if case in old else args[1]))
+
+    if regressions:
+        sys.stdout.write('%d regressions\n' % (regressions))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# Synthetic class and sequence diagram specs of any size, the same for the
+# same arguments. Prints a spec in the .suml file format (one expression
+# per line):
+#
+#   python benchmarks/generators.py class CLASSES [RELATIONS] > big.suml
+#   python benchmarks/generators.py sequence PARTICIPANTS MESSAGES > big.suml
+
+import sys
+import random
+
+COLOURS = ('orange', 'green', 'yellow', 'skyblue', 'pink', 'grey')
+CONNECTORS = ('-', '->', '<->', '<>->', '++->', '+-', '^-', '-.->', '1-*>', 'owner-items>', 'uses-.->')
+
+def classSpec(classes, relations=None, clusters=None, notes=None, colours=None, seed=0):
+    """ Class diagram with classes (some with members and colours), relations
+        between random classes, clusters of related classes and notes
+    """
+    rng = random.Random(seed)
+    if relations is None: relations = classes * 3 // 2
+    if clusters is None: clusters = classes // 50
+    if notes is None: notes = classes // 20
+    if colours is None: colours = classes // 10
+
+    lines = []
+    for i in range(classes):
+        members = ';'.join('+field%d_%d' % (i, j) for j in range(rng.randint(0, 3)))
+        bg = ''
+        if i < colours:
+            bg = '{bg:%s}' % (rng.choice(COLOURS))
+        if members:
+            lines.append('[Class%d|%s|+method%d()%s]' % (i, members, i, bg))
+        else:
+            lines.append('[Class%d%s]' % (i, bg))
+
+    for i in range(relations):
+        # mostly near each other, so there are components and clusters make sense
+        left = rng.randrange(classes)
+        right = min(classes - 1, left + rng.randint(1, 10)) if rng.random() < 0.9 else rng.randrange(classes)
+        lines.append('[Class%d]%s[Class%d]' % (left, rng.choice(CONNECTORS), right))
+
+    for i in range(clusters):
+        first = rng.randrange(classes)
+        members = ''.join('[Class%d]' % (j) for j in range(first, min(classes, first + rng.randint(2, 5))))
+        lines.append('[Package%d %s]' % (i, members))
+
+    for i in range(notes):
+        lines.append('[note: Note %d about this class{bg:cornsilk}]-[Class%d]' % (i, rng.randrange(classes)))
+
+    return '\n'.join(lines) + '\n'
+
+def sequenceSpec(participants, messages, seed=0):
+    """ Sequence diagram with messages between random participants """
+    rng = random.Random(seed)
+    lines = ['[Participant%d]' % (i) for i in range(participants)]
+    for i in range(messages):
+        left, right = rng.randrange(participants), rng.randrange(participants)
+        if rng.random() < 0.5:
+            lines.append('[Participant%d]message%d>[Participant%d]' % (left, i, right))
+        else:
+            lines.append('[Participant%d]<reply%d[Participant%d]' % (left, i, right))
+    return '\n'.join(lines) + '\n'
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] not in ('class', 'sequence'):
+        sys.exit('usage: generators.py class CLASSES [RELATIONS] | sequence PARTICIPANTS MESSAGES')
+    sizes = [int(n) for n in sys.argv[2:]]
+    if sys.argv[1] == 'class':
+        sys.stdout.write(classSpec(*sizes))
+    else:
+        sys.stdout.write(sequenceSpec(*sizes))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# Compares PNG rasterization backends on the diagrams from tests/ and
+# mksamples.sh. The SVG of every diagram is rendered once, then each
+# available backend rasterizes all of them.
+#
+#   python benchmarks/rasterizers.py [repeat]
+
+import io
+import os
+import sys
+import glob
+import time
+import shlex
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import suml
+import suml.cli
+import suml.raster
+
+root = os.path.join(os.path.dirname(__file__), '..')
+
+def fixtures():
+    """ Yields (name, spec, options) for all test and sample diagrams """
+    parser = suml.cli.createParser()
+    for name in sorted(glob.glob(os.path.join(root, 'tests', '*.suml'))):
+        argv = ['--svg']
+        if os.path.basename(name).startswith('sequence'):
+            argv.append('--sequence')
+        spec = open(name, 'r').read().replace('\n', ',')
+        yield os.path.basename(name), spec, parser.parse_args(argv)[0]
+
+    for line in open(os.path.join(root, 'mksamples.sh'), 'r'):
+        if not line.startswith('suml '):
+            continue
+        # suml [options] "spec" > output_file
+        argv = shlex.split(line)
+        output_file = argv[-1]
+        argv = argv[1:-2]
+        options, args = parser.parse_args(argv + ['--svg'])
+        options.png = False
+        yield os.path.basename(output_file), args[0], options
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+
+    svgs = []
+    for name, spec, options in fixtures():
+        fout = io.BytesIO()
+        suml.transform(spec, fout, options)
+        svgs.append((name, fout.getvalue()))
+    sys.stdout.write('%d diagrams, %d repeats\n' % (len(svgs), repeat))
+
+    parser = suml.cli.createParser()
+    for name in sorted(suml.raster.rasterizers):
+        rasterizer = suml.raster.rasterizers[name]
+        if not rasterizer.available():
+            sys.stdout.write('%-14s not available\n' % (name))
+            continue
+        options = parser.parse_args(['--png', '--rasterizer', name])[0]
+        size = 0
+        start = time.time()
+        for i in range(repeat):
+            for _, svg in svgs:
+                size += len(rasterizer.rasterize(svg, options))
+        elapsed = time.time() - start
+        sys.stdout.write('%-14s %8.1f ms/diagram %10d bytes\n' % (
+            name, elapsed * 1000.0 / (repeat * len(svgs)), size / repeat))
+
+if __name__ == '__main__':
+    main()
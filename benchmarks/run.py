@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# Times every stage of rendering synthetic class and sequence diagrams from
+# 10 to 10000 elements and writes the results as JSON, to be compared across
+# commits with benchmarks/compare.py:
+#
+#   python benchmarks/run.py -o before.json
+#   python benchmarks/run.py -o after.json --sizes 10,100 --formats svg,scruffy
+#
+# dot, pic2plot and convert that aren't installed are replaced by the
+# stand-ins in benchmarks/stubs (--stub uses them even if installed, for
+# numbers that don't depend on the Graphviz version).
+
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import optparse
+import platform
+import tempfile
+import subprocess
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import suml
+import suml.cli
+import suml.cache
+import suml.profile
+import generators
+
+TOOLS = ('dot', 'pic2plot', 'convert')
+FORMATS = {
+    'source': [],
+    'svg': ['--svg'],
+    'scruffy': ['--svg', '--scruffy', '--shadow'],
+    'png': ['--png'],
+}
+
+def which(program):
+    for path in os.environ.get('PATH', '').split(os.pathsep):
+        name = os.path.join(path, program)
+        if os.path.exists(name) and os.access(name, os.X_OK):
+            return name
+    return None
+
+def useStubs(tools):
+    """ Puts stand-ins for tools first in PATH, returns the temporary directory """
+    stubs = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stubs')
+    directory = tempfile.mkdtemp(prefix='suml-stubs-')
+    for tool in tools:
+        os.symlink(os.path.join(stubs, tool), os.path.join(directory, tool))
+    os.environ['PATH'] = directory + os.pathsep + os.environ.get('PATH', '')
+    return directory
+
+def gitCommit():
+    try:
+        out = subprocess.Popen(['git', 'describe', '--always', '--dirty'], cwd=root,
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE).communicate()[0]
+        return out.decode('utf-8').strip()
+    except OSError:
+        return ''
+
+def cases(sizes, formats):
+    """ Yields (name, kind, size, format, spec) """
+    for size in sizes:
+        spec = generators.classSpec(size)
+        for fmt in formats:
+            yield 'class-%d-%s' % (size, fmt), 'class', size, fmt, spec
+    for size in sizes:
+        spec = generators.sequenceSpec(max(2, min(50, size // 10)), size)
+        for fmt in formats:
+            yield 'sequence-%d-%s' % (size, fmt), 'sequence', size, fmt, spec
+
+def measure(kind, fmt, spec, repeat):
+    """ Returns (total wall time, {stage: measurements}), the minimum of repeat runs """
+    parser = suml.cli.createParser()
+    spec = spec.replace('\n', ',')
+    total = None
+    stages = {}
+    for i in range(repeat):
+        options = parser.parse_args(['--' + kind] + FORMATS[fmt])[0]
+        options.profiler = suml.profile.Profiler()
+        start = time.time()
+        suml.transform(spec, io.BytesIO(), options)
+        elapsed = time.time() - start
+        total = elapsed if total is None else min(total, elapsed)
+        for record in options.profiler.records:
+            current = record.asDict()
+            del current['stage']
+            if record.stage in stages:
+                for key in ('wall', 'cpu', 'child_cpu'):
+                    current[key] = min(current[key], stages[record.stage][key])
+            stages[record.stage] = current
+    return total, stages
+
+def main():
+    parser = optparse.OptionParser(usage='%prog [options]')
+    parser.add_option('-o', '--output', dest='output', help='JSON file (default: stdout)')
+    parser.add_option('--sizes', dest='sizes', default='10,100,1000,10000',
+            help='numbers of classes and messages (default: %default)')
+    parser.add_option('--formats', dest='formats', default=','.join(sorted(FORMATS)),
+            help='formats out of %s (default: all)' % (', '.join(sorted(FORMATS))))
+    parser.add_option('-r', '--repeat', type='int', dest='repeat', default=3,
+            help='runs of every case, the fastest one counts (default: %default)')
+    parser.add_option('--stub', action='store_true', dest='stub',
+            help='use stand-ins for all external tools')
+    (options, args) = parser.parse_args()
+
+    sizes = [int(size) for size in options.sizes.split(',')]
+    formats = options.formats.split(',')
+    for fmt in formats:
+        if fmt not in FORMATS:
+            parser.error('unknown format %s' % (fmt))
+
+    stubbed = [tool for tool in TOOLS if options.stub or which(tool) is None]
+    stubs = stubbed and useStubs(stubbed)
+    try:
+        # imports and the font index aren't part of any case
+        for fmt in formats:
+            measure('class', fmt, generators.classSpec(10), 1)
+            measure('sequence', fmt, generators.sequenceSpec(2, 10), 1)
+
+        results = []
+        for name, kind, size, fmt, spec in cases(sizes, formats):
+            total, stages = measure(kind, fmt, spec, options.repeat)
+            sys.stderr.write('%-24s %10.1f ms\n' % (name, total * 1000))
+            results.append({'case': name, 'kind': kind, 'size': size, 'format': fmt,
+                'wall': total, 'stages': stages})
+
+        report = {
+            'commit': gitCommit(),
+            'python': platform.python_version(),
+            'tools': dict((tool, suml.cache.toolVersion([tool])) for tool in TOOLS),
+            'stubbed': stubbed,
+            'repeat': options.repeat,
+            'results': results,
+        }
+    finally:
+        if stubs:
+            shutil.rmtree(stubs)
+
+    data = json.dumps(report, indent=2, sort_keys=True) + '\n'
+    if options.output:
+        with open(options.output, 'w') as f:
+            f.write(data)
+    else:
+        sys.stdout.write(data)
+
+if __name__ == '__main__':
+    main()
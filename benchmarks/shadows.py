@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# Time of the scruffy SVG rewrite with shadows on synthetic diagrams of
+# growing size, both with all shapes in one group (like pic2plot output) and
+# with a group per node (like dot output). Time per node should stay flat.
+#
+#   python benchmarks/shadows.py [nodes...]
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from suml import common
+
+class Options:
+    scruffy = True
+    shadow = True
+    font = None
+    seed = 1
+
+def syntheticSVG(nodes, grouped):
+    """ SVG with a box, a label and an arrow per node """
+    parts = ['<?xml version="1.0" encoding="UTF-8" standalone="no"?>',
+            '<svg xmlns="http://www.w3.org/2000/svg" width="%dpt" height="%dpt">' % (nodes * 10, nodes * 10),
+            '<g id="graph0" class="graph">',
+            '<polygon fill="white" stroke="none" points="0,0 0,%d %d,%d %d,0 0,0"/>' % (nodes * 10, nodes * 10, nodes * 10, nodes * 10)]
+    if not grouped:
+        parts.append('<g>')
+    for i in range(nodes):
+        x, y = (i % 100) * 80, (i // 100) * 60
+        if grouped:
+            parts.append('<g id="node%d" class="node">' % (i))
+        parts.append('<polygon fill="none" stroke="black" points="%d,%d %d,%d %d,%d %d,%d %d,%d"/>' % (
+                x, y, x + 60, y, x + 60, y + 30, x, y + 30, x, y))
+        parts.append('<text x="%d" y="%d">Node%d</text>' % (x + 5, y + 20, i))
+        parts.append('<polyline fill="none" stroke="black" points="%d,%d %d,%d"/>' % (x + 30, y + 30, x + 30, y + 60))
+        parts.append('<polygon fill="black" stroke="black" points="%d,%d %d,%d %d,%d %d,%d"/>' % (
+                x + 27, y + 55, x + 30, y + 60, x + 33, y + 55, x + 27, y + 55))
+        if grouped:
+            parts.append('</g>')
+    if not grouped:
+        parts.append('</g>')
+    parts.append('</g>')
+    parts.append('</svg>')
+    return '\n'.join(parts).encode('utf-8')
+
+def main():
+    sizes = [int(n) for n in sys.argv[1:]] or [1000, 2000, 4000, 8000]
+    for grouped in (False, True):
+        for nodes in sizes:
+            svg = syntheticSVG(nodes, grouped)
+            start = time.time()
+            common.rewrite(svg, Options())
+            elapsed = time.time() - start
+            sys.stdout.write('%-8s %6d nodes %8.3f s %8.1f us/node\n' % (
+                'grouped' if grouped else 'flat', nodes, elapsed, elapsed / nodes * 1e6))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# Throughput of common.splitYUML on large synthetic specs, compared with
+# the old character by character implementation. Checks first that both
+# produce the same tokens for tests/*.suml.
+#
+#   python benchmarks/tokenizer.py [megabytes]
+
+import os
+import sys
+import glob
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from suml import common
+
+def oldSplitYUML(spec):
+    word = ''
+    shapeDepth = 0
+    for c in spec:
+        if c == '[':
+            shapeDepth += 1
+        elif c == ']':
+            shapeDepth -= 1
+
+        if shapeDepth == 1 and c == '[':
+            yield word.strip()
+            word = c
+            continue
+
+        word += c
+        if shapeDepth == 0 and c == ']':
+            yield word.strip()
+            word = ''
+    if word:
+        yield word.strip()
+
+def syntheticSpec(size, members=1):
+    """ Class diagram spec of about size bytes """
+    lines = []
+    total = 0
+    i = 0
+    while total < size:
+        fields = ';'.join('+field%d_%d' % (i, j) for j in range(members))
+        line = '[Class%d|%s|+method%d()]<>1-items 0..*>[Class%d{bg:orange}],[Group%d [Class%d][Class%d]]' % (
+                i, fields, i, i + 1, i, i, i + 1)
+        lines.append(line)
+        total += len(line) + 1
+        i += 1
+    return ','.join(lines)
+
+def measure(split, spec):
+    start = time.time()
+    n = 0
+    for token in split(spec):
+        n += 1
+    return time.time() - start, n
+
+def main():
+    megabytes = float(sys.argv[1]) if len(sys.argv) > 1 else 4
+
+    root = os.path.join(os.path.dirname(__file__), '..')
+    for name in sorted(glob.glob(os.path.join(root, 'tests', '*.suml'))):
+        spec = open(name, 'r').read().replace('\n', ',')
+        if list(oldSplitYUML(spec)) != list(common.splitYUML(spec)):
+            sys.exit('%s: tokens differ' % (name))
+
+    for members in (1, 100):
+        spec = syntheticSpec(int(megabytes * 1024 * 1024), members)
+        for name, split in (('old', oldSplitYUML), ('splitYUML', common.splitYUML)):
+            elapsed, n = measure(split, spec)
+            sys.stdout.write('%3d members %-10s %8.2f MB/s %10d tokens %8.3f s\n' % (
+                members, name, len(spec) / elapsed / 1024 / 1024, n, elapsed))
+
+if __name__ == '__main__':
+    main()
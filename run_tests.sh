@@ -6,6 +6,7 @@ result=0
 for sequence in `ls $DIR/sequence*.suml`;
 do
     base=${sequence%.*}
+    case $base in *-paged) continue;; esac
     suml --sequence < $base.suml > $base.tmp
     diff $base.pic $base.tmp > /dev/null
     if [ $? -ne 0 ];
@@ -18,6 +19,37 @@ do
     fi
 done
 
+# pages of 4 steps, the path of sequence.pic depends on the installation
+for paged in `ls $DIR/sequence*-paged.suml`;
+do
+    base=${paged%.*}
+    suml --sequence --page-size 4 -i $paged | sed 's|^copy ".*";$|copy "sequence.pic";|' > $base.tmp
+    diff $base.pic $base.tmp > /dev/null
+    if [ $? -ne 0 ];
+    then
+        result=-1
+        echo "Changes for $paged -> $base.pic:"
+        diff -up $base.pic $base.tmp
+    else
+        rm -f $base.tmp
+    fi
+done
+
+for svg in `ls $DIR/sequence*.svg`;
+do
+    base=${svg%.*}
+    suml --sequence --sequence-renderer native --svg < $base.suml | python $DIR/canonical.py > $base.tmp
+    diff $svg $base.tmp > /dev/null
+    if [ $? -ne 0 ];
+    then
+        result=-1
+        echo "Changes for $base.suml -> $svg:"
+        diff -up $svg $base.tmp
+    else
+        rm -f $base.tmp
+    fi
+done
+
 for class in `ls $DIR/class*.suml`;
 do
     base=${class%.*}
@@ -32,4 +64,6 @@ do
     fi
 done
 
+$DIR/serverlibgvc.sh || result=-1
+
 exit $result
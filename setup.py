@@ -24,7 +24,7 @@ if which('dot') is None:
 if which('rsvg-convert') is None:
     sys.exit('You need rsvg-convert [librsvg2-bin] binary for this software to work')
 if which('pic2plot') is None:
-    sys.exit('You need pic2plot [plotutils] binary for this software to work')
+    sys.stderr.write('pic2plot [plotutils] binary not found, it is only needed for --sequence-renderer pic\n')
 
 setup(name='scruffy',
         version='0.3',
@@ -0,0 +1,97 @@
+# command line options by dest and their defaults, see Options
+_options = None
+_defaults = None
+
+def optionDefaults():
+    """ Returns ({dest: optparse.Option}, {dest: default}) of the command line options """
+    global _options, _defaults
+    if _options is None:
+        from . import cli
+        parser = cli.createParser()
+        _defaults = vars(parser.get_default_values())
+        _options = dict((option.dest, option) for option in parser.option_list if option.dest)
+    return _options, _defaults
+
+def checkOption(name, value):
+    """ Returns value of option name checked (and converted) like on the command line """
+    import optparse
+    option = optionDefaults()[0].get(name)
+    # defaults without a command line option (profiler, ...) take any value
+    if value is None or option is None or option.type is None:
+        return value
+    if option.type in ('int', 'float'):
+        value = str(value)
+    try:
+        return option.check_value(name, value)
+    except optparse.OptionValueError as e:
+        raise ValueError(str(e))
+
+class Options:
+    """ Rendering options: the attributes are the command line options with
+        the same defaults, named like their dest (font for --font-family,
+        klass for --class, ...)
+    """
+    def __init__(self, **options):
+        self.__dict__.update(optionDefaults()[1])
+        for name, value in options.items():
+            if name not in self.__dict__:
+                raise TypeError('unknown option %s' % (name))
+            setattr(self, name, checkOption(name, value))
+
+    def setOutput(self, kind, fmt):
+        """ Sets the kind of diagram ('class' or 'sequence') and the output
+            format ('dot' or 'pic' for the source, 'svg' or 'png')
+        """
+        if kind not in ('class', 'sequence'):
+            raise ValueError('unknown kind of diagram %s' % (kind))
+        self.sequence = kind == 'sequence'
+        self.klass = kind == 'class'
+
+        if fmt not in ('dot', 'pic', 'svg', 'png'):
+            raise ValueError('unknown format %s' % (fmt))
+        if fmt == {'class': 'pic', 'sequence': 'dot'}[kind]:
+            raise ValueError('%s diagrams have no %s source' % (kind, fmt))
+        self.svg = fmt == 'svg'
+        self.png = fmt == 'png'
+
+def render(spec, kind='class', fmt='svg', scruffy=False, shadow=False, font=None, **options):
+    """ Returns spec rendered as kind of diagram in fmt as bytes
+
+        kind is 'class' or 'sequence', fmt is 'dot' (or 'pic'), 'svg' or
+        'png'. Other options are Options attributes, e.g. seed=1,
+        rasterizer='cairosvg', dpi=150 or cache_dir='/var/cache/suml'.
+    """
+    import io
+    options = Options(scruffy=scruffy, shadow=shadow, font=font, **options)
+    options.setOutput(kind, fmt)
+    fout = io.BytesIO()
+    transform(spec, fout, options)
+    return fout.getvalue()
+
+def transform(spec, fout, options):
+    """ Renders spec as a class or sequence diagram (depending on options) into fout """
+    from . import fonts
+    fonts.chooseFont(options)
+
+    if options.sequence:
+        from . import suml2pic
+        suml2pic.transform(spec, fout, options)
+    else:
+        from . import yuml2dot
+        yuml2dot.transform(spec, fout, options)
+
+def transformMany(spec, outputs, options):
+    """ Renders spec into several (common.Output, fout) with one layout """
+    from . import fonts
+    # one font for all outputs, the scruffy one if any of them is scruffy
+    scruffy = options.scruffy
+    options.scruffy = scruffy or any(output.scruffy for output, _ in outputs)
+    fonts.chooseFont(options)
+    options.scruffy = scruffy
+
+    if options.sequence:
+        from . import suml2pic
+        suml2pic.transformMany(spec, outputs, options)
+    else:
+        from . import yuml2dot
+        yuml2dot.transformMany(spec, outputs, options)
@@ -0,0 +1,142 @@
+# Copyright (C) 2011 by Aivars Kalvans <aivars.kalvans@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+# asyncio rendering API (Python 3.7+), e.g. for aiohttp services:
+#
+#   png = await suml.aio.render('[A]->[B]', 'class', 'png', scruffy=True)
+#
+# dot, pic2plot and external rasterizers run with asyncio subprocesses,
+# parsing and the SVG rewrite (scruffy) run in an executor.
+
+import asyncio
+import weakref
+import multiprocessing
+
+from . import cache
+from . import common
+from . import fonts
+from . import profile
+from . import raster
+
+def makeOptions(kind, fmt, options):
+    """ Returns suml.Options for kind of diagram in fmt """
+    import suml
+    values = suml.Options(**options)
+    values.setOutput(kind, fmt)
+    return values
+
+async def communicate(command, data):
+    process = await asyncio.create_subprocess_exec(*command,
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE)
+    out, _ = await process.communicate(data)
+    return out
+
+class Renderer:
+    """ Renders diagrams, at most concurrency of them at a time """
+    def __init__(self, concurrency=None, executor=None):
+        self.semaphore = asyncio.Semaphore(concurrency or multiprocessing.cpu_count() * 2)
+        # None is the default executor of the event loop
+        self.executor = executor
+
+    def run(self, function, *args):
+        return asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def render(self, spec, kind='class', fmt='svg', **options):
+        """ Returns DOT/PIC source, SVG or PNG for spec as bytes """
+        options = makeOptions(kind, fmt, options)
+        async with self.semaphore:
+            # may have to build the font index
+            await self.run(fonts.chooseFont, options)
+            return await self.transform(spec, kind, options)
+
+    async def transform(self, spec, kind, options):
+        if options.sequence:
+            from .suml2pic import suml2pic as source
+            command = ['pic2plot', '-Tsvg']
+        else:
+            from .yuml2dot import yuml2dot as source
+            command = ['dot', '-Tsvg']
+
+        # tool versions and cache files block, keep them off the event loop
+        stage = await self.run(cache.stages, spec, kind, command, options)
+
+        async def cached(name, compute):
+            if stage.cache is None:
+                return await compute()
+            data = await self.run(stage.get, name)
+            if data is None:
+                data = await compute()
+                await self.run(stage.put, name, data)
+            return data
+
+        async def text():
+            return await self.run(lambda: common.toBytes(source(spec, options)))
+
+        async def laidOut():
+            source = await cached('source', text)
+            with profile.measure(options, 'layout', len(source)) as record:
+                if common.useLibrary(command, options):
+                    svg = await self.run(common.layout, command, source, options)
+                else:
+                    svg = await communicate(command, source)
+                record.bytesOut = len(svg)
+            return svg
+
+        if options.sequence and options.sequence_renderer == 'native':
+            from .suml2pic import layout
+            laidOut = lambda: self.run(layout, spec, options)
+        elif not options.sequence and options.split_components:
+            from .yuml2dot import layoutComponents
+            laidOut = lambda: self.run(layoutComponents, spec, options)
+
+        async def svg():
+            return await self.run(common.rewrite, await cached('layout', laidOut), options)
+
+        async def png():
+            rasterizer = await self.run(raster.getRasterizer, options)
+            data = await cached('svg', svg)
+            with profile.measure(options, 'rasterize', len(data)) as record:
+                if rasterizer.external:
+                    data = await communicate(rasterizer.command(options), data)
+                    data = await self.run(rasterizer.finish, data, options)
+                else:
+                    data = await self.run(rasterizer.rasterize, data, options)
+                record.bytesOut = len(data)
+            return data
+
+        if options.png:
+            return await cached('png', png)
+        elif options.svg:
+            return await cached('svg', svg)
+        return await cached('source', text)
+
+_renderers = weakref.WeakKeyDictionary()
+
+async def render(spec, kind='class', fmt='svg', **options):
+    """ Renders spec with the default Renderer of the running event loop
+
+        kind is 'class' or 'sequence', fmt is 'dot' (or 'pic'), 'svg' or
+        'png' and options are command line option names like scruffy=True,
+        shadow=True, font='Purisa' or rasterizer='rsvg-convert'.
+    """
+    loop = asyncio.get_running_loop()
+    if loop not in _renderers:
+        _renderers[loop] = Renderer()
+    return await _renderers[loop].render(spec, kind, fmt, **options)
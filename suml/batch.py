@@ -0,0 +1,150 @@
+# Copyright (C) 2011 by Aivars Kalvans <aivars.kalvans@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+# Renders many specs in one run, fanning them out over a pool of worker
+# processes instead of forking a new suml for each file.
+
+import io
+import os
+import sys
+import glob
+import traceback
+import multiprocessing
+
+import suml
+
+def outputExtension(options):
+    if options.png:
+        return '.png'
+    elif options.svg:
+        return '.svg'
+    elif options.sequence:
+        return '.pic'
+    return '.dot'
+
+def outputName(input_file, out_dir, options):
+    base = os.path.splitext(input_file)[0]
+    if out_dir:
+        base = os.path.join(out_dir, os.path.basename(base))
+    return base + outputExtension(options)
+
+def readManifest(manifest, out_dir, options):
+    """ Returns (input, output) jobs listed in manifest as "input [output]" lines """
+    jobs = []
+    for line in open(manifest, 'r'):
+        line = line.strip()
+        if not line or line.startswith('#'): continue
+        parts = line.split(None, 1)
+        if len(parts) == 2:
+            jobs.append((parts[0], parts[1].strip()))
+        else:
+            jobs.append((parts[0], outputName(parts[0], out_dir, options)))
+    return jobs
+
+def readDirectory(in_dir, out_dir, options):
+    """ Returns (input, output) jobs for all .suml files in in_dir """
+    return [(input_file, outputName(input_file, out_dir, options))
+            for input_file in sorted(glob.glob(os.path.join(in_dir, '*.suml')))]
+
+def readSpec(input_file):
+    # the same as reading from stdin: one expression per line
+    return open(input_file, 'r').read().replace('\n', ',')
+
+def renderFile(input_file, output_file, options, svg=None):
+    """ Renders one file (from laid out svg if given), returns (input, error message or None, cache stats) """
+    from . import cache, yuml2dot
+    store = cache.getCache(options)
+    try:
+        spec = readSpec(input_file)
+        # written only when rendered, a failed job leaves no (empty) output
+        fout = io.BytesIO()
+        if svg is not None:
+            yuml2dot.transform(spec, fout, options, lambda: svg)
+        else:
+            suml.transform(spec, fout, options)
+        with open(output_file, 'wb') as output:
+            output.write(fout.getvalue())
+    except Exception:
+        error = traceback.format_exc().strip().splitlines()[-1]
+    else:
+        error = None
+    return input_file, error, store and store.takeStats()
+
+def layoutChunk(jobs, options):
+    """ Lays out class diagrams of all jobs with one dot process, returns {input: svg} """
+    from . import cache, common, yuml2dot
+    command = ['dot', '-Tsvg']
+    pending = []
+    for input_file, _ in jobs:
+        try:
+            spec = readSpec(input_file)
+            if common.needsLayout(cache.stages(spec, 'class', command, options), options):
+                pending.append((input_file, yuml2dot.yuml2dot(spec, options)))
+        except Exception:
+            # reported when rendering the file
+            pass
+    svgs = common.layoutMany(command, [source for _, source in pending], options)
+    return dict(zip([input_file for input_file, _ in pending], svgs))
+
+def renderChunk(task):
+    """ Renders a chunk of jobs, returns list of renderFile results """
+    options, jobs = task
+    layouts = {}
+    if not options.sequence and not options.split_components and len(jobs) > 1:
+        layouts = layoutChunk(jobs, options)
+    return [renderFile(input_file, output_file, options, layouts.get(input_file))
+            for input_file, output_file in jobs]
+
+def render(jobs, options, processes=None):
+    """ Renders (input, output) jobs in parallel, returns number of failures
+
+        Jobs are handed to the workers in chunks and class diagrams of a
+        chunk are laid out by a single dot process.
+    """
+    from . import fonts
+    fonts.chooseFont(options)
+
+    for out_dir in set(os.path.dirname(output_file) for _, output_file in jobs):
+        if out_dir and not os.path.isdir(out_dir):
+            os.makedirs(out_dir)
+
+    processes = processes or multiprocessing.cpu_count()
+    chunksize = max(1, min(32, len(jobs) // (processes * 4)))
+
+    from . import cache
+    store = cache.getCache(options)
+
+    failed = 0
+    pool = multiprocessing.Pool(processes)
+    try:
+        chunks = [(options, jobs[i:i + chunksize]) for i in range(0, len(jobs), chunksize)]
+        for results in pool.imap_unordered(renderChunk, chunks):
+            for input_file, error, stats in results:
+                if stats:
+                    store.addStats(stats)
+                if error:
+                    failed += 1
+                    sys.stderr.write('%s: %s\n' % (input_file, error))
+    finally:
+        pool.close()
+        pool.join()
+
+    sys.stderr.write('%d rendered, %d failed\n' % (len(jobs) - failed, failed))
+    return failed
@@ -0,0 +1,240 @@
+# Copyright (C) 2011 by Aivars Kalvans <aivars.kalvans@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+# Content-addressed on-disk render cache.
+#
+# Every pipeline stage (DOT/PIC source, laid out SVG, final SVG, PNG) is
+# stored under a hash of the normalized spec, the options affecting that
+# stage and the versions of the external tools used so far. Entries are
+# evicted least recently used first when the cache grows over its size.
+
+import os
+import sys
+import errno
+import hashlib
+import tempfile
+import subprocess
+
+from . import common
+from . import gvc
+from . import raster
+
+DEFAULT_SIZE = 256 # MB
+
+_versions = {}
+def toolVersion(command):
+    """ Returns version string of external tool (empty if it's missing) """
+    tool = command[0]
+    if tool not in _versions:
+        flag = {'dot': '-V', 'convert': '-version'}.get(tool, '--version')
+        try:
+            out = subprocess.Popen([tool, flag], stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT).communicate()[0]
+            _versions[tool] = out.decode('utf-8', 'replace').strip().split('\n')[0]
+        except OSError:
+            _versions[tool] = ''
+    return _versions[tool]
+
+def normalize(spec):
+    """ Spec text in a canonical form: non-empty tokens without surrounding whitespace
+        and without leading or trailing separators
+    """
+    parts = [part for part in common.splitYUML(spec) if part]
+    while parts and not parts[0].strip(','):
+        parts.pop(0)
+    while parts and not parts[-1].strip(','):
+        parts.pop()
+    return '\n'.join(parts)
+
+def digest(*parts):
+    h = hashlib.sha1()
+    for part in parts:
+        if not isinstance(part, bytes):
+            part = part.encode('utf-8')
+        h.update(part)
+        h.update(b'\0')
+    return h.hexdigest()
+
+class Cache:
+    def __init__(self, path, size=DEFAULT_SIZE):
+        self.path = path
+        self.max_size = size * 1024 * 1024
+        self.size = None
+        self.hits = {}
+        self.misses = {}
+
+    def filename(self, key):
+        return os.path.join(self.path, key[:2], key[2:])
+
+    def get(self, stage, key):
+        name = self.filename(key)
+        try:
+            f = open(name, 'rb')
+            try:
+                data = f.read()
+            finally:
+                f.close()
+            # mtime is the last use time for LRU eviction
+            os.utime(name, None)
+        except (IOError, OSError):
+            self.misses[stage] = self.misses.get(stage, 0) + 1
+            return None
+        self.hits[stage] = self.hits.get(stage, 0) + 1
+        return data
+
+    def put(self, key, data):
+        name = self.filename(key)
+        try:
+            os.makedirs(os.path.dirname(name))
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        # write to a temporary file first, other processes may be reading
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(name))
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+        os.rename(tmp, name)
+
+        if self.size is None:
+            self.size = sum(size for _, _, size in self.entries())
+        self.size += len(data)
+        if self.size > self.max_size:
+            self.evict()
+
+    def entries(self):
+        """ Yields (mtime, filename, size) for all cache entries """
+        for dirpath, dirnames, filenames in os.walk(self.path):
+            for filename in filenames:
+                name = os.path.join(dirpath, filename)
+                try:
+                    st = os.stat(name)
+                except OSError:
+                    continue
+                yield st.st_mtime, name, st.st_size
+
+    def evict(self):
+        """ Removes least recently used entries until cache is at 90% of its size """
+        entries = sorted(self.entries())
+        self.size = sum(size for _, _, size in entries)
+        for mtime, name, size in entries:
+            if self.size <= self.max_size * 0.9:
+                break
+            try:
+                os.unlink(name)
+            except OSError:
+                pass
+            self.size -= size
+
+    def takeStats(self):
+        """ Returns and resets (hits, misses) per stage """
+        stats = self.hits, self.misses
+        self.hits, self.misses = {}, {}
+        return stats
+
+    def addStats(self, stats):
+        hits, misses = stats
+        for stage, n in hits.items():
+            self.hits[stage] = self.hits.get(stage, 0) + n
+        for stage, n in misses.items():
+            self.misses[stage] = self.misses.get(stage, 0) + n
+
+    def printStats(self, fout=sys.stderr):
+        for stage in ('source', 'layout', 'svg', 'png'):
+            hits, misses = self.hits.get(stage, 0), self.misses.get(stage, 0)
+            if hits or misses:
+                fout.write('cache %s: %d hits, %d misses\n' % (stage, hits, misses))
+
+_caches = {}
+def getCache(options):
+    """ Returns cache for options.cache_dir (one per process) or None """
+    path = getattr(options, 'cache_dir', None)
+    if not path:
+        return None
+    if path not in _caches:
+        _caches[path] = Cache(path, getattr(options, 'cache_size', None) or DEFAULT_SIZE)
+    return _caches[path]
+
+class Stages:
+    """ Looks up pipeline stages in the cache, computes (and stores) them on a miss
+
+        keys are the cache keys of the stages or functions returning them,
+        called when the stage is first needed.
+    """
+    def __init__(self, cache, keys):
+        self.cache = cache
+        self.keys = keys
+
+    def key(self, name):
+        if callable(self.keys[name]):
+            self.keys[name] = self.keys[name]()
+        return self.keys[name]
+
+    def __call__(self, name, compute):
+        data = self.get(name)
+        if data is None:
+            data = compute()
+            self.put(name, data)
+        return data
+
+    def get(self, name):
+        if self.cache is None:
+            return None
+        return self.cache.get(name, self.key(name))
+
+    def put(self, name, data):
+        if self.cache is not None:
+            self.cache.put(self.key(name), data)
+
+    def cached(self, name):
+        return self.cache is not None and os.path.exists(self.cache.filename(self.key(name)))
+
+def stages(spec, kind, command, options):
+    """ Returns Stages for rendering spec with options """
+    cache = getCache(options)
+    if cache is None:
+        return Stages(None, {})
+
+    # every stage depends on the ones before it
+    keys = {}
+    keys['source'] = digest('source', kind, normalize(spec), options.font or '')
+    if kind == 'sequence' and getattr(options, 'sequence_renderer', 'native') == 'native':
+        keys['layout'] = digest(keys['source'], 'native')
+    elif common.useLibrary(command, options) and gvc.version():
+        keys['layout'] = digest(keys['source'], 'libgvc ' + gvc.version())
+    else:
+        keys['layout'] = digest(keys['source'], toolVersion(command))
+    if getattr(options, 'split_components', False):
+        keys['layout'] = digest(keys['layout'], 'split-components')
+    keys['svg'] = digest(keys['layout'], str(bool(options.scruffy)), str(bool(options.shadow)),
+            str(getattr(options, 'seed', None)))
+    if options.scruffy:
+        from . import scruffy
+        # NumPy draws other random numbers for the same seed
+        keys['svg'] = digest(keys['svg'], scruffy.backend())
+
+    def png():
+        # only when rasterizing, the rasterizer may not be installed
+        rasterizer = raster.getRasterizer(options)
+        return digest(keys['svg'], rasterizer.name, rasterizer.version(),
+                str(options.dpi), str(options.scale), str(options.png_compression))
+    keys['png'] = png
+    return Stages(cache, keys)
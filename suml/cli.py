@@ -0,0 +1,275 @@
+# Copyright (C) 2011 by Aivars Kalvans <aivars.kalvans@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import sys
+import optparse
+import suml
+
+def createParser(parserClass=optparse.OptionParser):
+    parser = parserClass(usage='usage: %prog [options] <sUML string>')
+    parser.add_option('-p', '--png', action='store_true', dest='png',
+                    help='create a png file')
+    parser.add_option('-s', '--svg', action='store_true', dest='svg',
+                    help='create a svg file')
+    parser.add_option('--scruffy', action='store_true', dest='scruffy',
+                    help='process result with scruffy (works for svg and png output_file)')
+    parser.add_option('--shadow', action='store_true', dest='shadow', default=False,
+                    help='add shadow to scruffy output_file')
+    parser.add_option('--sequence', action='store_true', dest='sequence',
+                    help='draw sequence diagram')
+    parser.add_option('--class', action='store_true', dest='klass',
+                    help='draw class diagram')
+    parser.add_option('--emit', action='append', dest='emit', metavar='FORMAT=FILE',
+                    help='write FORMAT (source, svg, png, scruffy-svg or scruffy-png, PNGs optionally with @SCALE) to FILE, '
+                            'can be repeated to render several outputs from one layout')
+    parser.add_option('--page-size', action='store', type='int', dest='page_size', metavar='STEPS',
+                    help='split sequence diagram into pages of STEPS steps (a message takes 1, a message to self 2), '
+                            'repeated exchanges are folded into loops')
+    parser.add_option('--tiles', action='store', dest='tiles', metavar='DIR',
+                    help='write PNG tiles of all zoom levels to DIR/ZOOM/X/Y.png (for huge diagrams)')
+    parser.add_option('--tile-size', action='store', type='int', dest='tile_size', metavar='PIXELS',
+                    help='width and height of --tiles (default: 256)')
+    parser.add_option('-o', '--output_file', action='store', dest='output_file',
+                    help='output_file file name')
+    parser.add_option('-i', '--input_file', action='store', dest='input_file',
+                    help='input_file file name')
+    parser.add_option('--font-family', action='store', dest='font',
+                    help='set output_file font family')
+    parser.add_option('--seed', action='store', type='int', dest='seed',
+                    help='seed for scruffy look, the same seed gives the same output')
+    parser.add_option('--sequence-renderer', action='store', dest='sequence_renderer',
+                    choices=('native', 'pic'), default='native',
+                    help='draw SVG/PNG sequence diagrams with suml (native) or pic2plot (pic) (default: native)')
+    parser.add_option('--serve', action='store', dest='serve', metavar='ADDRESS',
+                    help='run a render server on [host:]port or on a unix socket path')
+    parser.add_option('--rasterizer', action='store', dest='rasterizer',
+                    choices=['auto', 'convert', 'rsvg-convert', 'cairosvg'],
+                    help='png backend: convert (default), rsvg-convert, cairosvg or auto')
+    parser.add_option('--dpi', action='store', type='float', dest='dpi',
+                    help='png resolution (default: 72 for convert, 96 for rsvg-convert and cairosvg)')
+    parser.add_option('--scale', action='store', type='float', dest='scale',
+                    help='png scale factor')
+    parser.add_option('--png-compression', action='store', type='int', dest='png_compression',
+                    metavar='0-9', help='png zlib compression level')
+    parser.add_option('--batch', action='store', dest='batch', metavar='MANIFEST',
+                    help='render all "input [output]" files listed in MANIFEST')
+    parser.add_option('--batch-dir', action='store', dest='batch_dir', metavar='DIR',
+                    help='render all .suml files in DIR')
+    parser.add_option('--out-dir', action='store', dest='out_dir', metavar='DIR',
+                    help='output directory for batch rendering')
+    parser.add_option('-j', '--jobs', action='store', type='int', dest='jobs',
+                    help='number of batch worker processes (default: number of cores)')
+    parser.add_option('--cache-dir', action='store', dest='cache_dir', metavar='DIR',
+                    help='cache rendering stages in DIR')
+    parser.add_option('--cache-size', action='store', type='int', dest='cache_size', metavar='MB',
+                    help='maximum size of the cache in megabytes (default: 256)')
+    parser.add_option('--cache-stats', action='store_true', dest='cache_stats',
+                    help='print cache hit/miss statistics')
+    parser.add_option('--libgvc', action='store_true', dest='libgvc',
+                    help='lay out class diagrams in-process with Graphviz libgvc if it is installed')
+    parser.add_option('--split-components', action='store_true', dest='split_components',
+                    help='lay out unconnected parts of a class diagram in parallel dot processes')
+    parser.add_option('--stream', action='store_true', dest='stream',
+                    help='parse and emit class diagram while reading input and rewrite SVG while dot/pic2plot writes it (for very large diagrams)')
+    parser.add_option('--profile', action='store_true', dest='profile',
+                    help='print time and bytes of each rendering stage to stderr')
+    parser.add_option('--profile-format', action='store', dest='profile_format',
+                    choices=('text', 'json'), default='text',
+                    help='format of --profile output: text or json (default: text)')
+    # profile.Profiler recording the stages (set by --profile or by API users)
+    parser.set_defaults(profiler=None)
+    # common.LayoutQueue sharing dot processes between threads (set by the render server)
+    parser.set_defaults(layout_queue=None)
+    parser.add_option('--watch', action='store_true', dest='watch',
+                    help='re-render input_file, --batch or --batch-dir files when they change')
+    return parser
+
+EMIT_FORMATS = {'source': 'source', 'dot': 'source', 'pic': 'source', 'svg': 'svg', 'png': 'png'}
+
+def parseEmit(value, options):
+    """ Returns (common.Output, file name) for --emit [scruffy-]FORMAT[@SCALE]=FILE """
+    from . import common
+    if '=' not in value:
+        raise ValueError('--emit %s: expected FORMAT=FILE' % (value))
+    format, filename = value.split('=', 1)
+    scruffy = options.scruffy
+    if format.startswith('scruffy-'):
+        format, scruffy = format[len('scruffy-'):], True
+    scale = None
+    if '@' in format:
+        format, scale = format.split('@', 1)
+        if format != 'png':
+            raise ValueError('--emit %s: only PNG can be scaled' % (value))
+        try:
+            scale = float(scale)
+        except ValueError:
+            raise ValueError('--emit %s: invalid scale %s' % (value, scale))
+    if format not in EMIT_FORMATS or (scruffy and EMIT_FORMATS[format] == 'source'):
+        raise ValueError('--emit %s: unknown format %s' % (value, format))
+    return common.Output(EMIT_FORMATS[format], scruffy, scale), filename
+
+def readChunks(options, args):
+    """ Returns spec as chunks to parse while reading, lines of input_file
+        or stdin are expressions like in batch.readSpec
+    """
+    if options.input_file:
+        lines = open(options.input_file, 'r')
+    elif len(args) == 0:
+        lines = sys.stdin
+    else:
+        return [args[0]]
+    return (line.replace('\n', ',') for line in lines)
+
+def printCacheStats(options):
+    if options.cache_stats:
+        from . import cache
+        store = cache.getCache(options)
+        if store:
+            store.printStats()
+
+def printProfile(options):
+    if options.profiler is not None:
+        options.profiler.report(sys.stderr, options.profile_format)
+
+def main(argv=None):
+    parser = createParser()
+    (options, args) = parser.parse_args(argv)
+
+    if len(args) > 1:
+        parser.error('Too many arguments')
+
+    if options.profile:
+        if options.serve or options.watch or options.batch or options.batch_dir:
+            parser.error('--profile works only for a single diagram')
+        from . import profile
+        options.profiler = profile.Profiler()
+
+    if options.emit:
+        if options.serve or options.watch or options.batch or options.batch_dir or options.stream:
+            parser.error('--emit works only for a single diagram without --stream')
+        if options.png or options.svg or options.output_file:
+            parser.error('--emit replaces --png, --svg and --output_file')
+        try:
+            outputs = [parseEmit(value, options) for value in options.emit]
+        except ValueError as e:
+            parser.error(str(e))
+
+    if options.tiles:
+        if options.serve or options.watch or options.batch or options.batch_dir or options.stream:
+            parser.error('--tiles works only for a single diagram without --stream')
+        if options.png or options.emit or options.output_file:
+            parser.error('--tiles replaces --png, --emit and --output_file')
+
+    if options.page_size is not None:
+        if options.page_size < 1:
+            parser.error('--page-size must be positive')
+        if not options.sequence:
+            parser.error('--page-size works only for sequence diagrams')
+        if options.serve or options.watch or options.batch or options.batch_dir or options.stream \
+                or options.emit or options.tiles:
+            parser.error('--page-size works only for a single diagram')
+        if (options.png or options.svg) and not options.output_file:
+            parser.error('--page-size with --svg or --png needs --output_file for the page names')
+
+    if options.serve:
+        from . import server
+        server.serve(options.serve, options)
+        return
+
+    if options.watch:
+        from . import batch
+        from . import watch
+        if options.batch_dir:
+            jobs = lambda: batch.readDirectory(options.batch_dir, options.out_dir, options)
+        elif options.batch:
+            jobs = watch.ManifestJobs(options.batch, options.out_dir, options)
+        elif options.input_file:
+            output_file = options.output_file or batch.outputName(options.input_file, options.out_dir, options)
+            jobs = lambda: [(options.input_file, output_file)]
+        else:
+            parser.error('--watch needs --input_file, --batch or --batch-dir')
+        watch.watch(jobs, options, options.jobs)
+        return
+
+    if options.batch or options.batch_dir:
+        from . import batch
+        if options.batch:
+            jobs = batch.readManifest(options.batch, options.out_dir, options)
+        else:
+            jobs = batch.readDirectory(options.batch_dir, options.out_dir, options)
+        failed = batch.render(jobs, options, options.jobs)
+        printCacheStats(options)
+        if failed:
+            sys.exit(1)
+        return
+
+    if options.page_size:
+        from . import fonts
+        from . import pages
+        fout = getattr(sys.stdout, 'buffer', sys.stdout)
+        if options.output_file and not (options.png or options.svg):
+            fout = open(options.output_file, 'wb')
+        fonts.chooseFont(options)
+        pages.render(readChunks(options, args), fout, options.output_file, options, options.jobs)
+        printProfile(options)
+        return
+
+    fout = getattr(sys.stdout, 'buffer', sys.stdout)
+    if options.output_file and not options.emit:
+        fout = open(options.output_file, 'wb')
+
+    if options.stream and not options.sequence:
+        from . import fonts
+        from . import yuml2dot
+        fonts.chooseFont(options)
+        yuml2dot.stream(readChunks(options, args), fout, options)
+        printProfile(options)
+        return
+
+    if options.input_file:
+        spec = open(options.input_file, 'r').read()
+    elif len(args) == 0:
+        lines = sys.stdin.read()
+        spec = lines.replace('\n', ',')
+    else:
+        spec = args[0]
+
+    if options.tiles:
+        import io
+        from . import profile
+        from . import tiles
+        svg = io.BytesIO()
+        options.svg = True
+        suml.transform(spec, svg, options)
+        with profile.measure(options, 'tiles', len(svg.getvalue())):
+            tiles.writePyramid(svg.getvalue(), options.tiles, options)
+    elif options.emit:
+        files = []
+        try:
+            for output, filename in outputs:
+                files.append((output, open(filename, 'wb')))
+            suml.transformMany(spec, files, options)
+        finally:
+            for _, fout in files:
+                fout.close()
+    else:
+        suml.transform(spec, fout, options)
+    printCacheStats(options)
+    printProfile(options)
@@ -18,72 +18,69 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
+import io
+import re
 import subprocess
+import threading
+import xml.etree.ElementTree as etree
 from PIL import Image, ImageChops
-from operator import attrgetter
 
 def hasFont(font_name):
-    """ Checks if font is installed (using fc-list; are there other possibilities?) """
-    stdout = subprocess.Popen(['fc-list', font_name], shell=True, stdout=subprocess.PIPE).stdout
-    return len(stdout.readlines()) > 0
+    """ Checks if font is installed (in the cached fc-list index) """
+    from . import fonts
+    return fonts.hasFont(font_name)
 
 def defaultScruffyFont():
     """ Returns installed font with scruffy look """
-    for font_name in ('Purisa',):
-        if hasFont(font_name):
-            return font_name
-    return None
-
-class Box:
-    n = 0
-    def __init__(self, name, spec):
-        self.name = name
-        self.spec = spec
-        self.uid = 'A%03d' % Box.n
-        self.right_margin = 0
-        self.width = 0
-        Box.n += 1
-
-    def update(self, spec):
-        if len(self.spec) < len(spec):
-            self.spec = spec
-        return self
-
-class Boxes:
-    def __init__(self):
-        self.boxes = {}
-
-    def addBox(self, spec):
-        name = spec.split('|')[0].strip()
-        if name not in self.boxes:
-            self.boxes[name] = Box(name, spec)
-        return self.boxes[name].update(spec)
-
-    def getBoxes(self):
-        res = self.boxes.values()
-        res.sort(key=attrgetter('uid'))
-        return res
+    from . import fonts
+    return fonts.findFont(fonts.SCRUFFY_FONTS)
 
-def splitYUML(spec):
-    word = ''
+class SpecError(ValueError):
+    pass
+
+_brackets = re.compile(r'[\[\]]')
+
+def tokenizeYUML(spec):
+    """ Yields (offset, token) for [shapes] (with nested shapes) and text between them """
+    return tokenizeYUMLChunks([spec])
+
+def tokenizeYUMLChunks(chunks):
+    """ Same as tokenizeYUML for spec given in chunks (e.g. lines of a file)
+
+        Only the brackets are visited, tokens are sliced out of the text
+        and only the unfinished token is kept between chunks.
+    """
+    text = ''
+    base = 0
     shapeDepth = 0
-    for c in spec:
-        if c == '[':
-            shapeDepth += 1
-        elif c == ']':
-            shapeDepth -= 1
-
-        if shapeDepth == 1 and c == '[':
-            yield word.strip()
-            word = c
-            continue
+    for chunk in chunks:
+        scanned = len(text)
+        text += chunk
+        start = 0
+        end = None
+        for match in _brackets.finditer(text, scanned):
+            i = match.start()
+            if text[i] == '[':
+                shapeDepth += 1
+                if shapeDepth == 1:
+                    end = i
+            else:
+                shapeDepth -= 1
+                if shapeDepth == 0:
+                    end = i + 1
+            if end is not None:
+                word = text[start:end].lstrip()
+                yield base + end - len(word), word.rstrip()
+                start, end = end, None
+        text = text[start:]
+        base += start
+    if text:
+        word = text.lstrip()
+        yield base + len(text) - len(word), word.rstrip()
 
-        word += c
-        if shapeDepth == 0 and c == ']':
-            yield word.strip()
-            word = ''
-    if word:
-        yield word.strip()
+def splitYUML(spec):
+    for offset, token in tokenizeYUML(spec):
+        yield token
 
 def crop(fin, fout):
     img = Image.open(fin)
@@ -100,3 +97,220 @@ def clear(root):
 
     for polygon in polygons:
         g.remove(polygon)
+
+def useLibrary(command, options):
+    """ Checks if command should run in-process with libgvc """
+    return command[0] == 'dot' and getattr(options, 'libgvc', False)
+
+def layout(command, source, options=None):
+    """ Lays out DOT/PIC source with command (dot or pic2plot), returns SVG """
+    if useLibrary(command, options):
+        from . import gvc
+        svg = gvc.layout(command, source)
+        if svg is not None:
+            return svg
+    queue = getattr(options, 'layout_queue', None)
+    if queue is not None and queue.command == command:
+        return queue.layout(source)
+    return subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE).communicate(input=source)[0]
+
+def toBytes(text):
+    """ DOT/PIC source for external tools and output files """
+    if not isinstance(text, bytes):
+        text = text.encode('utf-8')
+    return text
+
+def splitSVG(svg):
+    """ Splits concatenated SVG documents """
+    return [part.lstrip() + b'</svg>\n' for part in svg.split(b'</svg>')[:-1]]
+
+def layoutMany(command, sources, options=None):
+    """ Lays out several DOT graphs with one dot process, returns list of SVGs """
+    sources = [toBytes(source) for source in sources]
+    if useLibrary(command, options):
+        # no process to share
+        return [layout(command, source, options) for source in sources]
+    svgs = splitSVG(layout(command, b''.join(sources)))
+    if len(svgs) != len(sources):
+        # some graph is broken, don't let it take the others down
+        svgs = [layout(command, source) for source in sources]
+    return svgs
+
+class LayoutQueue:
+    """ Lays out DOT graphs of concurrent threads with shared dot processes:
+        the first graph is laid out right away and the ones that come while
+        dot runs are laid out together by the next run (with layoutMany)
+    """
+    def __init__(self, command):
+        self.command = command
+        self.lock = threading.Lock()
+        # [source, done event, svg or exception] waiting for the next run
+        self.pending = []
+        self.running = False
+
+    def layout(self, source):
+        entry = [toBytes(source), threading.Event(), None]
+        with self.lock:
+            self.pending.append(entry)
+            lead = not self.running
+            self.running = True
+        if not lead:
+            entry[1].wait()
+        if entry[2] is None:
+            # woken up to run the next batch
+            self.run()
+        if isinstance(entry[2], Exception):
+            raise entry[2]
+        return entry[2]
+
+    def run(self):
+        with self.lock:
+            batch, self.pending = self.pending, []
+        try:
+            results = layoutMany(self.command, [entry[0] for entry in batch])
+        except Exception as e:
+            results = [e] * len(batch)
+        for entry, result in zip(batch, results):
+            entry[2] = result
+            entry[1].set()
+        with self.lock:
+            if self.pending:
+                # the first one waiting runs the next batch
+                self.pending[0][1].set()
+            else:
+                self.running = False
+
+def rewrite(svg, options):
+    """ Clears SVG from layout tool and processes it with scruffy """
+    from . import profile
+    etree.register_namespace('', 'http://www.w3.org/2000/svg')
+    with profile.measure(options, 'svg-parse', len(svg)):
+        root = etree.parse(io.BytesIO(svg)).getroot()
+
+        clear(root)
+
+    if options.scruffy:
+        from . import scruffy
+
+        with profile.measure(options, 'scruffy'):
+            scruffy.transform(root, options)
+
+    with profile.measure(options, 'serialize') as record:
+        svg = b'<?xml version="1.0" encoding="UTF-8" standalone="no" ?>\n' + etree.tostring(root) + b'\n'
+        record.bytesOut = len(svg)
+    return svg
+
+def measuredLayout(command, source, options):
+    """ layout() recorded as a stage of options.profiler """
+    from . import profile
+    with profile.measure(options, 'layout', len(source)) as record:
+        svg = layout(command, source, options)
+        record.bytesOut = len(svg)
+    return svg
+
+def measuredRasterize(svg, options):
+    from . import profile
+    from . import raster
+    with profile.measure(options, 'rasterize', len(svg)) as record:
+        png = raster.rasterize(svg, options)
+        record.bytesOut = len(png)
+    return png
+
+def rewriteStream(fin, fout, options):
+    """ rewrite() for SVG read from fin, written to fout while it's parsed """
+    from . import svgstream
+    svgstream.rewrite(fin, fout, options)
+
+def needsLayout(stage, options):
+    """ Checks if output for options can't be made from cached stages without layout """
+    if options.png and stage.cached('png'):
+        return False
+    return (options.png or options.svg) and not stage.cached('svg') and not stage.cached('layout')
+
+def transform(spec, kind, source, command, fout, options, laidOut=None):
+    """ Writes DOT/PIC source, SVG or PNG for spec to fout
+
+        source is a function returning DOT/PIC text, command lays it out
+        unless laidOut function returns the layout already done elsewhere.
+        Every stage is looked up in the render cache (if enabled) before
+        running it, so a partial hit skips all the stages before it.
+    """
+    from . import cache
+    stage = cache.stages(spec, kind, command, options)
+
+    if getattr(options, 'stream', False) and options.svg and not options.png \
+            and stage.cache is None and laidOut is None:
+        from . import profile
+        # rewrite SVG while the layout tool writes it
+        process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        process.stdin.write(toBytes(source()))
+        process.stdin.close()
+        # includes waiting for the layout tool
+        with profile.measure(options, 'rewrite'):
+            rewriteStream(process.stdout, fout, options)
+            process.wait()
+        return
+
+    if options.png:
+        output = Output('png', options.scruffy)
+    elif options.svg:
+        output = Output('svg', options.scruffy)
+    else:
+        output = Output('source')
+    transformMany(spec, kind, source, command, [(output, fout)], options, laidOut)
+
+class Output:
+    """ An output of transformMany: 'source', 'svg' or 'png' format, scruffy
+        or not and PNG scale (None for options.scale)
+    """
+    def __init__(self, format, scruffy=False, scale=None):
+        self.format = format
+        self.scruffy = scruffy
+        self.scale = scale
+
+    def options(self, options):
+        """ Returns copy of options for rendering this output """
+        import copy
+        options = copy.copy(options)
+        options.scruffy = self.scruffy
+        options.svg = self.format == 'svg'
+        options.png = self.format == 'png'
+        if self.scale is not None:
+            options.scale = self.scale
+        return options
+
+def transformMany(spec, kind, source, command, outputs, options, laidOut=None):
+    """ Writes (Output, fout) outputs of spec with one layout
+
+        The source and layout are made once for all outputs, the SVG once
+        for plain and once for scruffy outputs, and PNGs are rasterized
+        from these. Arguments are the same as for transform.
+    """
+    from . import cache
+    done = {}
+
+    def once(key, compute):
+        if key not in done:
+            done[key] = compute()
+        return done[key]
+
+    stage = cache.stages(spec, kind, command, options)
+    text = lambda: once('source', lambda: stage('source', lambda: toBytes(source())))
+    laidOut = laidOut or (lambda: measuredLayout(command, text(), options))
+    layout = lambda: once('layout', lambda: stage('layout', laidOut))
+
+    for output, fout in outputs:
+        if output.format == 'source':
+            fout.write(text())
+            continue
+
+        variant = output.options(options)
+        # same source and layout keys, the later ones depend on variant
+        variantStage = cache.stages(spec, kind, command, variant)
+        svg = lambda: once(('svg', bool(variant.scruffy)),
+                lambda: variantStage('svg', lambda: rewrite(layout(), variant)))
+        if output.format == 'svg':
+            fout.write(svg())
+        else:
+            fout.write(once(('png', bool(variant.scruffy), variant.scale),
+                    lambda: variantStage('png', lambda: measuredRasterize(svg(), variant))))
@@ -0,0 +1,211 @@
+# Copyright (C) 2011 by Aivars Kalvans <aivars.kalvans@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+# Installed font index and glyph metrics.
+#
+# The index of installed fonts comes from fc-list once and is kept in
+# ~/.cache/suml/fonts.json until fc-list or fontconfig's caches change (this
+# is checked once per chooseFont call). Glyph widths are measured once per
+# font (with PIL) and kept in the same file.
+
+import os
+import json
+import tempfile
+import threading
+import subprocess
+
+# fallback list for scruffy look, the first installed one is used
+SCRUFFY_FONTS = ('Purisa', 'Humor Sans', 'xkcd', 'Comic Neue', 'Comic Sans MS')
+
+FONTCONFIG_CACHE_DIRS = (
+    '/var/cache/fontconfig',
+    '/usr/local/var/cache/fontconfig',
+    '~/.cache/fontconfig',
+    '~/.fontconfig',
+)
+
+REGULAR_STYLES = ('regular', 'book', 'normal', 'medium', 'roman')
+
+def indexFile():
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(cache_home, 'suml', 'fonts.json')
+
+def fontconfigStamp():
+    """ Modification times of fc-list and fontconfig cache directories, None
+        if fc-list isn't installed (then there's nothing to keep)
+    """
+    from .raster import which
+    fc_list = which('fc-list')
+    if fc_list is None:
+        return None
+    stamp = {fc_list: os.stat(fc_list).st_mtime}
+    for path in FONTCONFIG_CACHE_DIRS:
+        path = os.path.expanduser(path)
+        if os.path.isdir(path):
+            stamp[path] = os.stat(path).st_mtime
+    return stamp
+
+def listFonts():
+    """ Returns {family (lower case): (family, font file)} of installed fonts """
+    try:
+        out = subprocess.Popen(['fc-list', '--format', '%{family}\t%{style}\t%{file}\n'],
+                stdout=subprocess.PIPE).communicate()[0]
+    except OSError:
+        return {}
+
+    fonts = {}
+    for line in out.decode('utf-8', 'replace').splitlines():
+        parts = line.split('\t')
+        if len(parts) != 3:
+            continue
+        families, styles, filename = parts
+        regular = any(style.strip().lower() in REGULAR_STYLES for style in styles.split(','))
+        for family in families.split(','):
+            family = family.strip()
+            if family.lower() not in fonts or (regular and not fonts[family.lower()][2]):
+                fonts[family.lower()] = (family, filename, regular)
+    return dict((key, (family, filename)) for key, (family, filename, _) in fonts.items())
+
+class FontIndex:
+    def __init__(self, fonts, widths=None, stamp=None):
+        self.fonts = fonts
+        self.widths = widths or {}
+        self.stamp = stamp
+        self.averages = {}
+        # glyphWidths, averageWidth and save are called from server threads
+        self.lock = threading.RLock()
+
+    def save(self):
+        """ Writes the index to a temporary file and renames it over indexFile
+            so readers in other processes never see a partial index
+        """
+        if self.stamp is None:
+            return
+        filename = indexFile()
+        with self.lock:
+            try:
+                if not os.path.isdir(os.path.dirname(filename)):
+                    os.makedirs(os.path.dirname(filename))
+                fd, tmp = tempfile.mkstemp(dir=os.path.dirname(filename))
+                try:
+                    with os.fdopen(fd, 'w') as f:
+                        json.dump({'stamp': self.stamp, 'fonts': self.fonts, 'widths': self.widths}, f)
+                    os.rename(tmp, filename)
+                except:
+                    os.remove(tmp)
+                    raise
+            except (IOError, OSError):
+                pass
+
+    def hasFont(self, font_name):
+        return font_name.lower() in self.fonts
+
+    def glyphWidths(self, font_name):
+        """ Returns {character: advance width in em} for the printable ASCII
+            characters of font (or None if the font can't be measured)
+        """
+        key = font_name.lower()
+        with self.lock:
+            if key not in self.widths:
+                self.widths[key] = measureGlyphs(self.fonts[key][1]) if key in self.fonts else None
+                self.save()
+            return self.widths[key]
+
+    def averageWidth(self, font_name):
+        """ Returns average width of glyphWidths in em (None without them) """
+        key = font_name.lower()
+        with self.lock:
+            if key not in self.averages:
+                widths = self.glyphWidths(font_name)
+                self.averages[key] = sum(widths.values()) / len(widths) if widths else None
+            return self.averages[key]
+
+def measureGlyphs(filename):
+    try:
+        from PIL import ImageFont
+        font = ImageFont.truetype(filename, 1000)
+    except (ImportError, IOError, OSError):
+        return None
+    widths = {}
+    for c in map(chr, range(32, 127)):
+        if hasattr(font, 'getlength'):
+            widths[c] = font.getlength(c) / 1000.0
+        else:
+            widths[c] = font.getsize(c)[0] / 1000.0
+    return widths
+
+_index = None
+def index():
+    """ Returns FontIndex of this process, loads or builds it the first time """
+    if _index is None:
+        checkIndex()
+    return _index
+
+def checkIndex():
+    """ Loads FontIndex from disk or builds it if fontconfig changed since """
+    global _index
+    stamp = fontconfigStamp()
+    if _index is not None and _index.stamp == stamp:
+        return
+
+    if stamp is not None:
+        try:
+            with open(indexFile(), 'r') as f:
+                data = json.load(f)
+            if data['stamp'] == stamp:
+                _index = FontIndex(data['fonts'], data['widths'], stamp)
+                return
+        except (IOError, OSError, ValueError, KeyError):
+            pass
+
+    _index = FontIndex(listFonts(), {}, stamp)
+    _index.save()
+
+def hasFont(font_name):
+    return index().hasFont(font_name)
+
+def findFont(font_names):
+    """ Returns the first installed font of font_names """
+    for font_name in font_names:
+        if hasFont(font_name):
+            return font_name
+    return None
+
+def chooseFont(options):
+    """ Sets options.font to the first installed font of a comma separated
+        list (or to the default scruffy font)
+    """
+    checkIndex()
+    if options.font and ',' in options.font:
+        font_names = [font_name.strip() for font_name in options.font.split(',')]
+        options.font = findFont(font_names) or font_names[0]
+    elif options.scruffy and not options.font:
+        options.font = findFont(SCRUFFY_FONTS)
+
+def textWidth(text, font_name):
+    """ Returns width of text in em or None if font metrics aren't known """
+    if not font_name or not hasFont(font_name):
+        return None
+    fonts = index()
+    widths = fonts.glyphWidths(font_name)
+    if not widths:
+        return None
+    average = fonts.averageWidth(font_name)
+    return sum(widths.get(c, average) for c in text)
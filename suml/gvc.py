@@ -0,0 +1,110 @@
+# Copyright (C) 2011 by Aivars Kalvans <aivars.kalvans@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+# In-process layout with Graphviz's libgvc/libcgraph through ctypes: DOT is
+# parsed, laid out and rendered into a memory buffer without running dot.
+# Graphviz isn't thread safe, so all calls go through one lock; the calls
+# release the GIL, so other threads keep running while a graph is laid out.
+
+import ctypes
+import ctypes.util
+import threading
+
+_lock = threading.Lock()
+_library = None
+
+class Library:
+    def __init__(self, gvc, cgraph):
+        self.gvc = gvc
+        self.cgraph = cgraph
+
+        cgraph.agmemread.restype = ctypes.c_void_p
+        cgraph.agmemread.argtypes = [ctypes.c_char_p]
+        cgraph.agclose.argtypes = [ctypes.c_void_p]
+        gvc.gvContext.restype = ctypes.c_void_p
+        gvc.gvcVersion.restype = ctypes.c_char_p
+        gvc.gvcVersion.argtypes = [ctypes.c_void_p]
+        gvc.gvLayout.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_char_p]
+        gvc.gvFreeLayout.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+        # the length is unsigned int in older versions and size_t since 3.0,
+        # a zeroed size_t holds either on little endian machines
+        gvc.gvRenderData.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_char_p,
+                ctypes.POINTER(ctypes.c_void_p), ctypes.POINTER(ctypes.c_size_t)]
+        gvc.gvFreeRenderData.argtypes = [ctypes.c_void_p]
+
+        self.context = gvc.gvContext()
+        if not self.context:
+            raise OSError('gvContext failed')
+        self.version = gvc.gvcVersion(self.context).decode('ascii')
+
+    def render(self, source, engine, format):
+        """ Returns source laid out with engine in format, None if it can't be parsed """
+        graph = self.cgraph.agmemread(source)
+        if not graph:
+            return None
+        try:
+            if self.gvc.gvLayout(self.context, graph, engine) != 0:
+                return None
+            try:
+                data = ctypes.c_void_p()
+                length = ctypes.c_size_t(0)
+                if self.gvc.gvRenderData(self.context, graph, format, ctypes.byref(data), ctypes.byref(length)) != 0:
+                    return None
+                try:
+                    return ctypes.string_at(data, length.value)
+                finally:
+                    self.gvc.gvFreeRenderData(data)
+            finally:
+                self.gvc.gvFreeLayout(self.context, graph)
+        finally:
+            self.cgraph.agclose(graph)
+
+def load():
+    """ Returns Library, or None if libgvc/libcgraph aren't installed """
+    global _library
+    with _lock:
+        if _library is None:
+            _library = False
+            gvc, cgraph = ctypes.util.find_library('gvc'), ctypes.util.find_library('cgraph')
+            if gvc and cgraph:
+                try:
+                    _library = Library(ctypes.CDLL(gvc), ctypes.CDLL(cgraph))
+                except (OSError, AttributeError):
+                    pass
+        return _library or None
+
+def version():
+    """ Returns version of the loaded libgvc (empty if it's missing) """
+    library = load()
+    return library.version if library else ''
+
+def layout(command, source):
+    """ Lays out DOT source like command (e.g. dot -Tsvg) would, returns None
+        if libgvc is missing or fails so that the caller can run command
+    """
+    library = load()
+    if library is None:
+        return None
+    format = 'svg'
+    for arg in command[1:]:
+        if arg.startswith('-T'):
+            format = arg[2:]
+    with _lock:
+        return library.render(source, command[0].encode('ascii'), format.encode('ascii'))
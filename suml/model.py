@@ -0,0 +1,192 @@
+# Copyright (C) 2011 by Aivars Kalvans <aivars.kalvans@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+# Parsed diagram shared by the emitters.
+#
+# Nodes are numbered in the order they first appear in the spec, names and
+# edge attributes are interned, and edges are kept as rows of ints in one
+# array instead of a tuple (and strings) per relation.
+
+from array import array
+
+class Names(object):
+    """ Interned strings, each one stored once and referred to by its index """
+    __slots__ = ('names', 'ids')
+
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+
+    def intern(self, name):
+        id = self.ids.get(name)
+        if id is None:
+            id = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return id
+
+    def __getitem__(self, id):
+        return self.names[id]
+
+    def __len__(self):
+        return len(self.names)
+
+class Node(object):
+    __slots__ = ('id', 'kind', 'name', 'label', 'bg', 'members', 'width', 'right_margin')
+
+    def __init__(self, id, kind, name, label, bg='', members=()):
+        self.id = id
+        self.kind = kind
+        self.name = name
+        self.label = label
+        self.bg = bg
+        self.members = members
+        self.width = 0
+        self.right_margin = 0
+
+    def update(self, label):
+        """ Keeps the longest label (the one with all attributes) """
+        if len(self.label) < len(label):
+            self.label = label
+        return self
+
+class Edge(object):
+    __slots__ = ('id', 'tail', 'head', 'style', 'arrowtail', 'taillabel', 'arrowhead', 'headlabel', 'label')
+
+class Edges:
+    """ Edges as rows of tail and head node ids and interned attributes """
+    FIELDS = Edge.__slots__[1:]
+    ATTRIBUTES = FIELDS[2:]
+
+    def __init__(self, names, unique=False):
+        self.names = names
+        self.data = array('i')
+        # hash of row -> id (or list of ids if hashes collide), to collapse
+        # identical edges without keeping a copy of every row
+        self.rows = {} if unique else None
+
+    def add(self, tail, head, **attributes):
+        """ Returns id of the new edge (or of the identical one if edges are unique) """
+        row = [tail, head]
+        for name in self.ATTRIBUTES:
+            row.append(self.names.intern(attributes.get(name, '')))
+        id = len(self)
+        if self.rows is not None:
+            key = hash(tuple(row))
+            ids = self.rows.get(key)
+            if ids is not None:
+                for same in ids if isinstance(ids, list) else [ids]:
+                    if self.row(same) == row:
+                        return same
+                self.rows[key] = (ids if isinstance(ids, list) else [ids]) + [id]
+            else:
+                self.rows[key] = id
+        self.data.extend(row)
+        return id
+
+    def row(self, id):
+        """ Returns tail, head and attribute ids of edge id as a list """
+        return self.data[id * len(self.FIELDS):(id + 1) * len(self.FIELDS)].tolist()
+
+    def __len__(self):
+        return len(self.data) // len(self.FIELDS)
+
+    def __getitem__(self, id):
+        if not 0 <= id < len(self):
+            raise IndexError(id)
+        row = self.row(id)
+        edge = Edge()
+        edge.id = id
+        edge.tail, edge.head = row[0], row[1]
+        for name, value in zip(self.ATTRIBUTES, row[2:]):
+            setattr(edge, name, self.names[value])
+        return edge
+
+    def __iter__(self):
+        for id in range(len(self)):
+            yield self[id]
+
+class Diagram:
+    """ Nodes (unique by name) and edges between them
+
+        With uniqueEdges identical edges (same nodes and attributes) are
+        stored once.
+    """
+    def __init__(self, uniqueEdges=False):
+        self.names = Names()
+        self.nodes = []
+        self.named = {}
+        self.edges = Edges(self.names, uniqueEdges)
+
+    def __contains__(self, name):
+        return self.names.ids.get(name) in self.named
+
+    def __getitem__(self, name):
+        """ Returns node by name """
+        id = self.names.ids.get(name)
+        if id not in self.named:
+            raise KeyError(name)
+        return self.nodes[self.named[id]]
+
+    def addNode(self, kind, name, label, bg='', members=()):
+        """ Returns node with name, adding it if it's new """
+        if name in self:
+            return self[name].update(label)
+        node = Node(len(self.nodes), kind, self.names.intern(name), label, bg, members)
+        self.named[node.name] = node.id
+        self.nodes.append(node)
+        return node
+
+    def addEdge(self, tail, head, **attributes):
+        return self.edges[self.edges.add(tail.id, head.id, **attributes)]
+
+    def components(self):
+        """ Returns connected components as lists of node ids, with clusters
+            joined to their members, ordered by their first node
+        """
+        parent = list(range(len(self.nodes)))
+
+        def find(id):
+            while parent[id] != id:
+                parent[id] = parent[parent[id]]
+                id = parent[id]
+            return id
+
+        def union(a, b):
+            a, b = find(a), find(b)
+            if a != b:
+                parent[max(a, b)] = min(a, b)
+
+        data = self.edges.data
+        stride = len(Edges.FIELDS)
+        for i in range(0, len(data), stride):
+            union(data[i], data[i + 1])
+        for node in self.nodes:
+            for member in node.members:
+                union(node.id, member)
+
+        components = {}
+        order = []
+        for node in self.nodes:
+            root = find(node.id)
+            if root not in components:
+                components[root] = []
+                order.append(root)
+            components[root].append(node.id)
+        return [components[root] for root in order]
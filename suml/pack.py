@@ -0,0 +1,88 @@
+# Copyright (C) 2011 by Aivars Kalvans <aivars.kalvans@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+# Packs SVG documents laid out separately (e.g. the connected components of a
+# class diagram) into one document that looks like it came from a single dot
+# run: the graph0 group of each one is moved next to the others with shelf
+# packing, their backgrounds are dropped and ids are made unique.
+
+import math
+import xml.etree.ElementTree as etree
+
+SVG = '{http://www.w3.org/2000/svg}'
+# space between packed documents in points
+GAP = 16
+
+def length(value):
+    """ Returns SVG length like 123pt or 123 as float """
+    return float(value.rstrip('ptx'))
+
+def size(root):
+    """ Returns (width, height) of SVG root in user units """
+    viewBox = root.get('viewBox')
+    if viewBox:
+        _, _, width, height = viewBox.split()
+        return float(width), float(height)
+    return length(root.get('width')), length(root.get('height'))
+
+def shelves(sizes, gap=GAP):
+    """ Returns (positions, width, height) placing sizes on shelves, tallest first """
+    width = max(max(w for w, _ in sizes), math.sqrt(sum(w * h for w, h in sizes)))
+    positions = [None] * len(sizes)
+    x = y = shelf = 0
+    right = 0
+    for i in sorted(range(len(sizes)), key=lambda i: -sizes[i][1]):
+        w, h = sizes[i]
+        if x and x + w > width:
+            x, y, shelf = 0, y + shelf + gap, 0
+        positions[i] = (x, y)
+        right = max(right, x + w)
+        x += w + gap
+        shelf = max(shelf, h)
+    return positions, right, y + shelf
+
+def pack(svgs, gap=GAP):
+    """ Returns one SVG document with the graphs of svgs side by side """
+    etree.register_namespace('', SVG[1:-1])
+    etree.register_namespace('xlink', 'http://www.w3.org/1999/xlink')
+    roots = [etree.fromstring(svg) for svg in svgs]
+    positions, width, height = shelves([size(root) for root in roots], gap)
+
+    root = etree.Element(SVG + 'svg', {'width': '%dpt' % math.ceil(width),
+            'height': '%dpt' % math.ceil(height), 'viewBox': '0.00 0.00 %.2f %.2f' % (width, height)})
+    graph = etree.SubElement(root, SVG + 'g', {'id': 'graph0', 'class': 'graph'})
+    etree.SubElement(graph, SVG + 'title').text = 'G'
+    etree.SubElement(graph, SVG + 'polygon', {'fill': 'white', 'stroke': 'none',
+            'points': '0,0 0,%.2f %.2f,%.2f %.2f,0 0,0' % (height, width, height, width)})
+
+    for i, (part, (x, y)) in enumerate(zip(roots, positions)):
+        source = part.find(SVG + 'g')
+        group = etree.SubElement(graph, SVG + 'g', {'id': 'component%d' % (i), 'class': 'component',
+                'transform': ('translate(%.2f %.2f) ' % (x, y)) + source.get('transform', '')})
+        for elem in source:
+            # background and title of the part
+            if elem.tag in (SVG + 'polygon', SVG + 'title'):
+                continue
+            for child in elem.iter():
+                if 'id' in child.attrib:
+                    child.set('id', 'c%d_%s' % (i, child.get('id')))
+            group.append(elem)
+
+    return b'<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n' + etree.tostring(root) + b'\n'
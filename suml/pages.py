@@ -0,0 +1,212 @@
+# Copyright (C) 2011 by Aivars Kalvans <aivars.kalvans@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+# Long sequence diagrams (e.g. from request traces): messages are read as a
+# stream, runs of a repeated exchange are folded into one "xN loop" message
+# and the rest is split into pages of a fixed number of steps. The first
+# pass finds the participants and the room their messages need and spools
+# the folded messages to a temporary file; the pages are then read back one
+# at a time and rendered in parallel worker processes. Every page shows all
+# participants with the same widths and spacing, so the pages line up.
+
+import os
+import copy
+import pickle
+import tempfile
+import collections
+import multiprocessing
+
+from . import model
+from . import suml2pic
+
+# longest exchange (in messages) that is looked for when folding
+MAX_PERIOD = 8
+
+def foldRepeats(messages, maxPeriod=MAX_PERIOD):
+    """ Yields (block, count) for messages: block is a list of messages that
+        were repeated count times in a row. Only 2 * maxPeriod messages are
+        kept in memory.
+    """
+    messages = iter(messages)
+    window = []
+
+    def fill(size):
+        while len(window) < size:
+            try:
+                window.append(next(messages))
+            except StopIteration:
+                return False
+        return True
+
+    while fill(2 * maxPeriod) or window:
+        period = 0
+        for p in range(1, len(window) // 2 + 1):
+            if window[:p] == window[p:2 * p]:
+                period = p
+                break
+        if not period:
+            yield [window.pop(0)], 1
+            continue
+
+        block = window[:period]
+        count = 0
+        while fill(period) and window[:period] == block:
+            del window[:period]
+            count += 1
+        yield block, count
+
+def loopLabel(label, count):
+    return '%s (x%d loop)' % (label, count) if label else 'x%d loop' % (count)
+
+def steps(tail, head):
+    """ Returns the height of a message in steps, a message to self takes 2 """
+    return 2 if tail == head else 1
+
+class Trace:
+    """ Participants and folded messages of a long sequence diagram, split
+        into pages of pageSize steps between loops
+    """
+    def __init__(self, chunks, options, pageSize):
+        self.diagram = model.Diagram()
+        # (page number, sender id, receiver id, message) of every message
+        self.spool = tempfile.TemporaryFile()
+        page = used = 0
+        nodes = self.diagram.nodes
+        messages = self.messages(suml2pic.sumlExprChunks(chunks), options)
+        for block, count in foldRepeats(messages):
+            # a loop isn't split, a page longer than pageSize holds one that doesn't fit
+            size = sum(steps(node1, node2) for node1, node2, _ in block)
+            if used and used + size > pageSize:
+                page += 1
+                used = 0
+            used += size
+            for i, (node1, node2, label) in enumerate(block):
+                if i == 0 and count > 1:
+                    label = loopLabel(label, count)
+                suml2pic.makeRoom(nodes[node1], nodes[node2], label, options)
+                pickle.dump((page, node1, node2, label), self.spool, pickle.HIGHEST_PROTOCOL)
+        self.count = page + 1
+
+    def messages(self, exprs, options):
+        """ Yields (sender id, receiver id, message) of exprs, adding objects to the diagram """
+        for expr in exprs:
+            message = suml2pic.addParticipants(self.diagram, expr, options)
+            if message is not None:
+                yield message[0].id, message[1].id, message[2]
+
+    def pages(self):
+        """ Yields (nodes, edges) of every page as plain tuples, reading one
+            page at a time from the spool
+        """
+        nodes = [(node.label, node.width, node.right_margin) for node in self.diagram.nodes]
+        self.spool.seek(0)
+        page, edges = 0, []
+        while True:
+            try:
+                number, tail, head, label = pickle.load(self.spool)
+            except EOFError:
+                break
+            if number != page:
+                yield nodes, edges
+                page, edges = number, []
+            edges.append((tail, head, label))
+        yield nodes, edges
+
+    def close(self):
+        self.spool.close()
+
+def pageDiagram(nodes, edges):
+    """ Returns model.Diagram of a page """
+    diagram = model.Diagram()
+    for label, width, right_margin in nodes:
+        node = diagram.addNode('record', label.split('|')[0].strip(), label)
+        node.width = width
+        node.right_margin = right_margin
+    for tail, head, label in edges:
+        diagram.addEdge(diagram.nodes[tail], diagram.nodes[head], label=label)
+    return diagram
+
+def renderPage(task):
+    """ Returns PIC source, SVG or PNG of a page """
+    from . import common
+    nodes, edges, options = task
+    diagram = pageDiagram(nodes, edges)
+    if not (options.svg or options.png):
+        return common.toBytes(suml2pic.picSource(diagram))
+
+    if options.sequence_renderer == 'native':
+        from . import seqsvg
+        svg = seqsvg.sequenceSVG(diagram, options)
+    else:
+        svg = common.layout(['pic2plot', '-Tsvg'], common.toBytes(suml2pic.picSource(diagram)))
+    svg = common.rewrite(svg, options)
+    if options.png:
+        from . import raster
+        return raster.rasterize(svg, options)
+    return svg
+
+def pageName(output_file, number, count):
+    """ Returns output_file with page number before the extension """
+    base, ext = os.path.splitext(output_file)
+    return '%s-%0*d%s' % (base, len(str(count)), number, ext)
+
+def render(chunks, fout, output_file, options, processes=None):
+    """ Renders spec in chunks as pages of options.page_size steps, written
+        to fout one after another (PIC) or to numbered output_file names
+        (SVG/PNG), returns the number of pages
+    """
+    from . import profile
+    with profile.measure(options, 'parse'):
+        trace = Trace(chunks, options, options.page_size)
+
+    # worker processes don't record stages
+    workerOptions = copy.copy(options)
+    workerOptions.profiler = None
+    processes = min(processes or multiprocessing.cpu_count(), trace.count)
+
+    with profile.measure(options, 'pages') as record:
+        pool = multiprocessing.Pool(processes)
+        # pages handed to the pool and not written yet
+        pending = collections.deque()
+
+        def write(number):
+            data = pending.popleft().get()
+            record.bytesOut += len(data)
+            if options.svg or options.png:
+                with open(pageName(output_file, number, trace.count), 'wb') as page:
+                    page.write(data)
+            else:
+                fout.write(data)
+
+        written = 0
+        try:
+            for nodes, edges in trace.pages():
+                pending.append(pool.apply_async(renderPage, ((nodes, edges, workerOptions),)))
+                if len(pending) >= 2 * processes:
+                    written += 1
+                    write(written)
+            while pending:
+                written += 1
+                write(written)
+        finally:
+            pool.close()
+            pool.join()
+            trace.close()
+    return trace.count
@@ -0,0 +1,112 @@
+# Copyright (C) 2011 by Aivars Kalvans <aivars.kalvans@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+# Per stage timings of a render: wall time, CPU time (own and of the
+# external tools) and bytes in/out of parsing, DOT/PIC emission, layout,
+# the SVG rewrite and rasterization.
+#
+#   options.profiler = profile.Profiler()
+#   options.profiler.addHook(lambda record: sys.stderr.write(record.stage))
+#
+# CPU times are process-wide, so they overlap when several renders run at
+# once (render server threads, asyncio).
+
+import os
+import sys
+import json
+import time
+import contextlib
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+def cpuTimes():
+    """ Returns CPU seconds used by this process and by its finished children """
+    if resource is not None:
+        own = resource.getrusage(resource.RUSAGE_SELF)
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return own.ru_utime + own.ru_stime, children.ru_utime + children.ru_stime
+    times = os.times()
+    return times[0] + times[1], times[2] + times[3]
+
+class Record:
+    """ Measurements of one stage, bytesOut is set by the stage itself """
+    def __init__(self, stage, bytesIn=0):
+        self.stage = stage
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.childCpu = 0.0
+        self.bytesIn = bytesIn
+        self.bytesOut = 0
+
+    def asDict(self):
+        return {'stage': self.stage, 'wall': self.wall, 'cpu': self.cpu, 'child_cpu': self.childCpu,
+                'bytes_in': self.bytesIn, 'bytes_out': self.bytesOut}
+
+class Profiler:
+    def __init__(self):
+        self.records = []
+        self.hooks = []
+
+    def addHook(self, hook):
+        """ hook(record) is called when each stage is finished """
+        self.hooks.append(hook)
+
+    @contextlib.contextmanager
+    def measure(self, stage, bytesIn=0):
+        record = Record(stage, bytesIn)
+        wall = time.time()
+        cpu, childCpu = cpuTimes()
+        try:
+            yield record
+        finally:
+            record.wall = time.time() - wall
+            cpuEnd, childCpuEnd = cpuTimes()
+            record.cpu = cpuEnd - cpu
+            record.childCpu = childCpuEnd - childCpu
+            self.records.append(record)
+            for hook in self.hooks:
+                hook(record)
+
+    def report(self, fout=sys.stderr, format='text'):
+        if format == 'json':
+            fout.write(json.dumps({'stages': [record.asDict() for record in self.records]}, indent=2) + '\n')
+            return
+        fout.write('%-12s %10s %10s %10s %10s %10s\n' % ('stage', 'wall ms', 'cpu ms', 'tool ms', 'bytes in', 'bytes out'))
+        for record in self.records:
+            fout.write('%-12s %10.2f %10.2f %10.2f %10d %10d\n' % (record.stage, record.wall * 1000,
+                    record.cpu * 1000, record.childCpu * 1000, record.bytesIn, record.bytesOut))
+        fout.write('%-12s %10.2f %10.2f %10.2f\n' % ('total',
+                sum(record.wall for record in self.records) * 1000,
+                sum(record.cpu for record in self.records) * 1000,
+                sum(record.childCpu for record in self.records) * 1000))
+
+@contextlib.contextmanager
+def _unmeasured(stage, bytesIn=0):
+    yield Record(stage, bytesIn)
+
+def measure(options, stage, bytesIn=0):
+    """ Context manager measuring stage with options.profiler (if any), yields Record """
+    profiler = getattr(options, 'profiler', None)
+    if profiler is None:
+        return _unmeasured(stage, bytesIn)
+    return profiler.measure(stage, bytesIn)
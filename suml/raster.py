@@ -0,0 +1,141 @@
+# Copyright (C) 2011 by Aivars Kalvans <aivars.kalvans@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+# SVG to PNG rasterization backends:
+#   convert       ImageMagick (default)
+#   rsvg-convert  librsvg command line tool
+#   cairosvg      in-process, when the cairosvg module is importable
+#   auto          the first available of cairosvg, rsvg-convert, convert
+
+import io
+import os
+import subprocess
+
+class Rasterizer:
+    name = None
+    # runs command as a child process (or in-process otherwise)
+    external = True
+    # resolution without --dpi
+    defaultDPI = 96.0
+
+    def available(self):
+        return which(self.name) is not None
+
+    def version(self):
+        from . import cache
+        return cache.toolVersion([self.name])
+
+    def command(self, options):
+        raise NotImplementedError
+
+    def finish(self, png, options):
+        """ Post-processes png from command """
+        return png
+
+    def rasterize(self, svg, options):
+        png = subprocess.Popen(self.command(options), stdin=subprocess.PIPE, stdout=subprocess.PIPE).communicate(input=svg)[0]
+        return self.finish(png, options)
+
+class ConvertRasterizer(Rasterizer):
+    name = 'convert'
+    defaultDPI = 72.0
+
+    def command(self, options):
+        command = ['convert']
+        if options.dpi or options.scale:
+            command += ['-density', '%f' % (getDPI(options) * (options.scale or 1.0))]
+        if options.png_compression is not None:
+            # tens digit is zlib level, 5 selects adaptive filtering
+            command += ['-quality', '%d' % (options.png_compression * 10 + 5)]
+        if len(command) == 1:
+            return ['convert', '-', '-']
+        return command + ['svg:-', 'png:-']
+
+class RsvgRasterizer(Rasterizer):
+    name = 'rsvg-convert'
+
+    def command(self, options):
+        command = ['rsvg-convert', '-f', 'png']
+        if options.dpi:
+            command += ['-d', str(options.dpi), '-p', str(options.dpi)]
+        if options.scale:
+            command += ['-z', str(options.scale)]
+        return command
+
+    def finish(self, png, options):
+        return recompress(png, options)
+
+class CairoRasterizer(Rasterizer):
+    name = 'cairosvg'
+    external = False
+
+    def available(self):
+        try:
+            import cairosvg
+        except (ImportError, OSError):
+            return False
+        return True
+
+    def version(self):
+        import cairosvg
+        return 'cairosvg %s' % (cairosvg.__version__)
+
+    def rasterize(self, svg, options):
+        import cairosvg
+        png = cairosvg.svg2png(bytestring=svg, dpi=getDPI(options), scale=options.scale or 1.0)
+        return recompress(png, options)
+
+rasterizers = {
+    'convert': ConvertRasterizer(),
+    'rsvg-convert': RsvgRasterizer(),
+    'cairosvg': CairoRasterizer(),
+}
+
+def which(program):
+    for path in os.environ.get('PATH', '').split(os.pathsep):
+        exe_file = os.path.join(path, program)
+        if os.path.exists(exe_file) and os.access(exe_file, os.X_OK):
+            return exe_file
+    return None
+
+def getDPI(options):
+    return options.dpi or getRasterizer(options).defaultDPI
+
+def recompress(png, options):
+    """ Saves png with options.png_compression zlib level (for backends without it) """
+    if options.png_compression is None:
+        return png
+    from PIL import Image
+    fout = io.BytesIO()
+    Image.open(io.BytesIO(png)).save(fout, 'png', compress_level=options.png_compression)
+    return fout.getvalue()
+
+def getRasterizer(options):
+    name = options.rasterizer or 'convert'
+    if name == 'auto':
+        for name in ('cairosvg', 'rsvg-convert', 'convert'):
+            if rasterizers[name].available():
+                break
+    if name not in rasterizers:
+        raise ValueError('unknown rasterizer %s' % (name))
+    return rasterizers[name]
+
+def rasterize(svg, options):
+    return getRasterizer(options).rasterize(svg, options)
@@ -32,23 +32,39 @@ import math
 import random
 import xml.etree.ElementTree as etree
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+def backend():
+    """ Name of the jitter implementation, a seed gives the same output only with the same one """
+    return 'numpy' if numpy is not None else 'python'
+
 # python2.6 support
-if sys.version_info[0:2] < (2, 7, 0):
+if sys.version_info[0:2] < (2, 7):
     etree.register_namespace = lambda x, y: None
 
-gCoordinates = 'px'
+class Context:
+    """ State of one transform: coordinate units, gradients used and the
+        random generator (seeded for repeatable output)
+    """
+    def __init__(self, coordinates='px', seed=None):
+        self.coordinates = coordinates
+        self.usedColors = []
+        self.random = random.Random(seed)
 
-def getPixels(n):
-    if gCoordinates == 'px': return n
-    elif gCoordinates == 'in': return n * 96.0
+    def getPixels(self, n):
+        if self.coordinates == 'px': return n
+        elif self.coordinates == 'in': return n * 96.0
 
-def putPixels(n):
-    if gCoordinates == 'px': return n
-    elif gCoordinates == 'in': return n / 96.0
+    def putPixels(self, n):
+        if self.coordinates == 'px': return n
+        elif self.coordinates == 'in': return n / 96.0
 
-def parsePoints(points):
+def parsePoints(points, context):
     points = points.split()
-    return [(getPixels(float(x)), getPixels(float(y))) for x, y in [point.split(',') for point in points]]
+    return [(context.getPixels(float(x)), context.getPixels(float(y))) for x, y in [point.split(',') for point in points]]
 
 def lineLength(p1, p2):
     dx = p2[0] - p1[0]
@@ -64,10 +80,10 @@ def splitLine(p1, p2, l):
     ay = dy / lp
     return (p1[0] + l * ax, p1[1] + l * ay)
 
-def frandrange(start, stop):
+def frandrange(rng, start, stop):
     ''' random.randrange for floats '''
     start, stop = int(start * 10.0), int(stop * 10.0)
-    r = random.randrange(start, stop)
+    r = rng.randrange(start, stop)
     return r / 10.0
 
 SVG_NS = 'http://www.w3.org/2000/svg'
@@ -92,29 +108,73 @@ def transformLine2Polyline(elem):
     elem.attrib['points'] = '%(x1)s,%(y1)s %(x2)s,%(y2)s' % elem.attrib
     for key in ('x1', 'x2', 'y1', 'y2'): del elem.attrib[key]
 
-def transformPolyline(elem):
-    points = parsePoints(elem.attrib['points'])
+def transformPolyline(elem, context):
+    rng = context.random
+    points = parsePoints(elem.attrib['points'], context)
     newPoints = []
-    for i in xrange(len(points) - 1):
+    for i in range(len(points) - 1):
         p1, p2 = points[i], points[i + 1]
 
         newPoints.append(p1)
         l = lineLength(p1, p2)
         if l > 10:
-            p = splitLine(p1, p2, frandrange(4, l - 4))
+            p = splitLine(p1, p2, frandrange(rng, 4, l - 4))
             newPoints.append((
-                p[0] + frandrange(0.5, 2) * random.choice([1, -1]),
-                p[1] + frandrange(0.5, 2) * random.choice([1, -1])
+                p[0] + frandrange(rng, 0.5, 2) * rng.choice([1, -1]),
+                p[1] + frandrange(rng, 0.5, 2) * rng.choice([1, -1])
             ))
 
     newPoints.append(points[-1])
 
-    elem.attrib['points'] = ' '.join(['%f,%f' % (putPixels(p[0]), putPixels(p[1])) for p in newPoints])
+    elem.attrib['points'] = ' '.join(['%f,%f' % (context.putPixels(p[0]), context.putPixels(p[1])) for p in newPoints])
+
+def jitterPolylines(elems, context):
+    """ transformPolyline for all elems in one batch with NumPy
+
+        Split points and offsets are drawn from the same distributions as in
+        transformPolyline, the generator is seeded from context.random.
+    """
+    strings = [elem.attrib['points'] for elem in elems]
+    counts = numpy.array([points.count(',') for points in strings])
+    coords = numpy.array(' '.join(strings).replace(',', ' ').split(), dtype=float).reshape(-1, 2)
+    coords = context.getPixels(coords)
+
+    # segments start at every point except the last one of each elem
+    ends = numpy.cumsum(counts) - 1
+    isStart = numpy.ones(len(coords), dtype=bool)
+    isStart[ends] = False
+    starts = numpy.flatnonzero(isStart)
+
+    delta = coords[starts + 1] - coords[starts]
+    lengths = numpy.hypot(delta[:, 0], delta[:, 1])
+    split = lengths > 10
+    starts, delta, lengths = starts[split], delta[split], lengths[split]
+
+    rng = numpy.random.RandomState(context.random.getrandbits(32))
+    # frandrange(4, l - 4) along the segment, frandrange(0.5, 2) with random sign across
+    along = rng.randint(40, numpy.floor((lengths - 4) * 10.0).astype(int)) / 10.0
+    offsets = rng.randint(5, 20, (len(starts), 2)) / 10.0 * rng.choice([1, -1], (len(starts), 2))
+    added = coords[starts] + delta * (along / lengths)[:, None] + offsets
+
+    # every point moves forward by the number of points added before it
+    shift = numpy.zeros(len(coords), dtype=int)
+    shift[starts + 1] = 1
+    positions = numpy.arange(len(coords)) + numpy.cumsum(shift)
+    result = numpy.empty((len(coords) + len(starts), 2))
+    result[positions] = coords
+    result[positions[starts] + 1] = added
+    result = context.putPixels(result).ravel().tolist()
 
-_usedColors = {}
+    newCounts = counts + numpy.bincount(numpy.searchsorted(ends, starts), minlength=len(elems))
+    formats = {}
+    offset = 0
+    for elem, count in zip(elems, newCounts.tolist()):
+        if count not in formats:
+            formats[count] = ' '.join(['%f,%f'] * count)
+        elem.attrib['points'] = formats[count] % tuple(result[offset:offset + 2 * count])
+        offset += 2 * count
 
 def transformPolygon(elem):
-    transformPolyline(elem)
     fill = elem.get('fill', '')
     if not fill or fill == 'none':
         elem.attrib['fill'] = 'white'
@@ -122,31 +182,29 @@ def transformPolygon(elem):
 def transformText(elem, font):
     elem.attrib['font-family'] = font
 
-def transformAddShade(root, elem):
-    # Need to prepend element of the same shape
-    shade = root.makeelement(elem.tag, elem.attrib)
-    for i, child in enumerate(root):
-        if child == elem:
-            root.insert(i, shade)
-            break
+def transformAddShade(layer, elem, context):
+    # Need an element of the same shape beneath it
+    shade = etree.SubElement(layer, elem.tag, elem.attrib)
 
     shade.attrib['fill'] = '#999999'
     shade.attrib['stroke'] = '#999999'
     shade.attrib['stroke-width'] = shade.attrib.get('stroke-width', '1')
     # check for transform
-    #shade.attrib['transform'] = 'translate(%f, %f)' % (putPixels(4), putPixels(-4))
-    shade.attrib['transform'] = 'translate(%f, %f) ' % (putPixels(4), putPixels(4))
+    #shade.attrib['transform'] = 'translate(%f, %f)' % (context.putPixels(4), context.putPixels(-4))
+    shade.attrib['transform'] = 'translate(%f, %f) ' % (context.putPixels(4), context.putPixels(4))
     #shade.attrib['style'] = 'opacity:0.75;filter:url(#filterBlur)'
 
-def transformAddGradient(elem):
+def transformAddGradient(elem, context):
     fill = elem.get('fill', '')
     if fill == 'none':
         elem.attrib['fill'] = 'white'
     elif fill != 'black' and fill:
-        _usedColors[fill] = True
+        if fill not in context.usedColors:
+            context.usedColors.append(fill)
         elem.attrib['style'] = 'fill:url(#' + fill + ');' + elem.attrib.get('style', '')
 
-def _transform(root, options, level=0):
+def _transform(root, options, shapes, level=0):
+    """ Collects (parent, polygon/polyline) in document order, changes the rest """
     for child in root[:]:
 
         if child.tag == ns('rect'):
@@ -156,38 +214,68 @@ def _transform(root, options, level=0):
 
         # Skip background rect/polygon
         if child.tag == ns('polygon') and level != 0:
-            transformPolygon(child)
-            if options.shadow:
-                transformAddShade(root, child)
-            transformAddGradient(child)
-
+            shapes.append((root, child))
         elif child.tag == ns('path'):
             #transformAddShade(root, child)
             pass
         elif child.tag == ns('polyline'):
-            transformPolyline(child)
+            shapes.append((root, child))
             #see class diagram - shade of inside line
             #transformAddShade(root, child)
         elif child.tag == ns('text'):
             if options.font:
                 transformText(child, options.font)
 
-        _transform(child, options, level + 1)
+        _transform(child, options, shapes, level + 1)
 
-    if level == 0:
-        defs = root.makeelement(ns('defs'), {})
-        root.insert(0, defs)
-        filterBlur = etree.SubElement(defs, ns('filter'), {'id': 'filterBlur'})
-        etree.SubElement(filterBlur, ns('feGaussianBlur'), {'stdDeviation': '0.69', 'id':'feGaussianBlurBlur'})
-        for name in _usedColors:
-            gradient = etree.SubElement(defs, ns('linearGradient'), {'id': name, 'x1':"0%", 'xy':"0%", 'x2':"100%", 'y2':"100%"})
-            etree.SubElement(gradient, ns('stop'), {'offset':'0%', 'style':'stop-color:white;stop-opacity:1'})
-            etree.SubElement(gradient, ns('stop'), {'offset':'50%', 'style':'stop-color:%s;stop-opacity:1' % name})
+def makeDefs(root, context):
+    """ Returns <defs> with filters and the gradients used so far """
+    defs = root.makeelement(ns('defs'), {})
+    filterBlur = etree.SubElement(defs, ns('filter'), {'id': 'filterBlur'})
+    etree.SubElement(filterBlur, ns('feGaussianBlur'), {'stdDeviation': '0.69', 'id':'feGaussianBlurBlur'})
+    for name in context.usedColors:
+        gradient = etree.SubElement(defs, ns('linearGradient'), {'id': name, 'x1':"0%", 'xy':"0%", 'x2':"100%", 'y2':"100%"})
+        etree.SubElement(gradient, ns('stop'), {'offset':'0%', 'style':'stop-color:white;stop-opacity:1'})
+        etree.SubElement(gradient, ns('stop'), {'offset':'50%', 'style':'stop-color:%s;stop-opacity:1' % name})
+    return defs
 
-def transform(root, options):
+def createContext(root, options):
+    """ Returns Context for document with root element (its attributes are enough) """
+    coordinates = 'px'
     w, h = root.attrib.get('width', ''), root.attrib.get('height', '')
     if w.endswith('in') or h.endswith('in'):
-        global gCoordinates
-        gCoordinates = 'in'
+        coordinates = 'in'
+    return Context(coordinates, getattr(options, 'seed', None))
+
+def transformShapes(shapes, options, context):
+    """ Jitters, fills and shades (parent, polygon/polyline) collected by _transform """
+    # all points are jittered before shades copy them
+    elems = [elem for _, elem in shapes if elem.attrib.get('points', '').strip()]
+    if numpy is not None and elems:
+        jitterPolylines(elems, context)
+    else:
+        for elem in elems:
+            transformPolyline(elem, context)
 
-    _transform(root, options)
+    # shades of a group go to one layer beneath its first shadowed shape
+    layers = []
+    layerOf = {}
+    for parent, elem in shapes:
+        if elem.tag == ns('polygon'):
+            transformPolygon(elem)
+            if options.shadow:
+                if parent not in layerOf:
+                    layerOf[parent] = parent.makeelement(ns('g'), {'class': 'shadow'})
+                    layers.append((parent, elem, layerOf[parent]))
+                transformAddShade(layerOf[parent], elem, context)
+            transformAddGradient(elem, context)
+
+    for parent, first, layer in layers:
+        parent.insert(list(parent).index(first), layer)
+
+def transform(root, options):
+    context = createContext(root, options)
+    shapes = []
+    _transform(root, options, shapes)
+    transformShapes(shapes, options, context)
+    root.insert(0, makeDefs(root, context))
@@ -0,0 +1,142 @@
+# Copyright (C) 2011 by Aivars Kalvans <aivars.kalvans@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+# Draws sequence diagrams as SVG directly from the model.Diagram of suml2pic,
+# without pic2plot. The geometry is that of the sequence.pic macros used by
+# suml2pic (object3, step, active, message, complete) and the document is
+# structured like dot output: a group per object and per message in graph0.
+
+from .svgstream import escape, escapeAttribute
+
+# points per inch, sizes below are in inches like in sequence.pic
+DPI = 72
+SPACING = 0.25
+ACTIVE_WIDTH = 0.1
+BOX_HEIGHT = 0.3
+MOVE_WIDTH = 0.5
+LINE_WIDTH = 0.5
+ARROW_HEIGHT = 0.1
+ARROW_WIDTH = 0.05
+FONT_SIZE = 0.14
+MARGIN = 4
+
+def points(coordinates):
+    return ' '.join('%.2f,%.2f' % (x * DPI, y * DPI) for x, y in coordinates)
+
+def rectangle(left, top, right, bottom):
+    return [(left, top), (right, top), (right, bottom), (left, bottom), (left, top)]
+
+def arrowHead(x1, y1, x2, y2):
+    """ Returns points of the arrow head at (x2, y2) of horizontal or vertical line """
+    dx, dy = (x2 > x1) - (x2 < x1), (y2 > y1) - (y2 < y1)
+    bx, by = x2 - dx * ARROW_HEIGHT, y2 - dy * ARROW_HEIGHT
+    return [(bx - dy * ARROW_WIDTH, by + dx * ARROW_WIDTH), (x2, y2),
+            (bx + dy * ARROW_WIDTH, by - dx * ARROW_WIDTH), (bx - dy * ARROW_WIDTH, by + dx * ARROW_WIDTH)]
+
+class Layout:
+    """ Positions of objects and messages in inches, y grows downwards """
+    def __init__(self, diagram, options):
+        from .suml2pic import getTextWidth
+        self.centers = []
+        self.messages = []
+        x = 0
+        for node in diagram.nodes:
+            self.centers.append(x + node.width / 2.0)
+            right = x + node.width
+            x = right + (node.right_margin or MOVE_WIDTH)
+        self.width = right if diagram.nodes else 0
+
+        # step() and active() for all objects
+        y = BOX_HEIGHT / 2.0 + SPACING
+        self.activeTop = y
+        for edge in diagram.edges:
+            y += SPACING
+            self.messages.append((edge, y))
+            if edge.tail == edge.head:
+                y += SPACING
+                self.width = max(self.width, self.centers[edge.tail] + ACTIVE_WIDTH * 0.6 + LINE_WIDTH +
+                        ARROW_WIDTH + getTextWidth(edge.label, options))
+        self.activeBottom = y + SPACING
+        self.height = self.activeBottom
+
+    def messageLine(self, edge, y):
+        """ Returns points of the message arrow and position of its label """
+        x1, x2 = self.centers[edge.tail], self.centers[edge.head]
+        offset = ACTIVE_WIDTH * 0.6
+        if x1 == x2:
+            x1 += offset
+            line = [(x1, y), (x1 + LINE_WIDTH, y), (x1 + LINE_WIDTH, y + SPACING), (x1, y + SPACING)]
+            return line, (x1 + LINE_WIDTH + ARROW_WIDTH, y + SPACING / 2.0, 'start')
+        if x1 > x2:
+            offset = -offset
+        line = [(x1 + offset, y), (x2 - offset, y)]
+        # above the arrow
+        return line, ((x1 + x2) / 2.0, y - FONT_SIZE * 0.6, 'middle')
+
+def sequenceSVG(diagram, options):
+    """ Returns SVG drawing of sequence diagram (model.Diagram from suml2pic.sumlDiagram) """
+    from .suml2pic import nodeId
+    layout = Layout(diagram, options)
+    width = layout.width * DPI + 2 * MARGIN
+    height = layout.height * DPI + 2 * MARGIN
+    margin = MARGIN / float(DPI)
+    font = 'font-family="%s" font-size="%.2f"' % (escapeAttribute(options.font or 'Helvetica'), FONT_SIZE * DPI)
+
+    def text(x, y, anchor, label):
+        return '<text text-anchor="%s" x="%.2f" y="%.2f" %s>%s</text>' % (
+                anchor, x * DPI, y * DPI + FONT_SIZE * DPI / 3.0, font, escape(label))
+
+    def polyline(coordinates, extra=''):
+        return '<polyline fill="none" stroke="black"%s points="%s"/>' % (extra, points(coordinates))
+
+    def polygon(coordinates, fill):
+        return '<polygon fill="%s" stroke="black" points="%s"/>' % (fill, points(coordinates))
+
+    svg = ['<?xml version="1.0" encoding="UTF-8" standalone="no"?>',
+            '<svg width="%.2fpt" height="%.2fpt" viewBox="0.00 0.00 %.2f %.2f" xmlns="http://www.w3.org/2000/svg">' % (
+                width, height, width, height),
+            '<g id="graph0" class="graph" transform="translate(%d %d)">' % (MARGIN, MARGIN),
+            '<polygon fill="white" stroke="none" points="%s"/>' % (points(rectangle(
+                -margin, -margin, layout.width + margin, layout.height + margin)))]
+
+    half = ACTIVE_WIDTH / 2.0
+    for node, x in zip(diagram.nodes, layout.centers):
+        left = x - node.width / 2.0
+        svg.append('<g id="node%d" class="node">' % (node.id + 1))
+        svg.append('<title>%s</title>' % (nodeId(node)))
+        svg.append(polygon(rectangle(left, 0, left + node.width, BOX_HEIGHT), 'none'))
+        svg.append(text(x, BOX_HEIGHT / 2.0, 'middle', node.label))
+        svg.append(polyline([(x, BOX_HEIGHT), (x, layout.activeTop)], ' stroke-dasharray="5,2"'))
+        svg.append(polygon(rectangle(x - half, layout.activeTop, x + half, layout.activeBottom), 'none'))
+        svg.append('</g>')
+
+    for i, (edge, y) in enumerate(layout.messages):
+        line, (x, labelY, anchor) = layout.messageLine(edge, y)
+        svg.append('<g id="edge%d" class="edge">' % (i + 1))
+        svg.append('<title>%s&#45;&gt;%s</title>' % (nodeId(diagram.nodes[edge.tail]), nodeId(diagram.nodes[edge.head])))
+        svg.append(polyline(line))
+        svg.append(polygon(arrowHead(line[-2][0], line[-2][1], line[-1][0], line[-1][1]), 'black'))
+        if edge.label:
+            svg.append(text(x, labelY, anchor, edge.label))
+        svg.append('</g>')
+
+    svg.append('</g>')
+    svg.append('</svg>')
+    return ('\n'.join(svg) + '\n').encode('utf-8')
@@ -0,0 +1,215 @@
+# Copyright (C) 2011 by Aivars Kalvans <aivars.kalvans@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+# Long-running render server, so that repeated renders don't pay for the
+# interpreter startup, imports and font probing each time.
+#
+# Speaks plain HTTP on a TCP port or on a unix socket:
+#   POST /?sequence&png&scruffy  with the sUML spec as request body
+#   GET  /?spec=[A]->[B]&svg
+# Query parameters are the same as the command line options.
+
+import io
+import os
+import sys
+import copy
+import optparse
+import traceback
+
+try:
+    import BaseHTTPServer
+    import SocketServer
+    from urlparse import urlsplit, parse_qsl
+except ImportError:
+    import http.server as BaseHTTPServer
+    import socketserver as SocketServer
+    from urllib.parse import urlsplit, parse_qsl
+
+import suml
+from . import cli
+from . import common
+
+# largest dpi * scale of a request, bounds the size of PNG bitmaps
+MAX_RESOLUTION = 600
+# options of the server that aren't defaults of its requests
+REQUEST_ONLY = ('png', 'svg', 'sequence', 'klass', 'serve', 'input_file', 'output_file',
+        'batch', 'batch_dir', 'out_dir', 'stream', 'watch', 'profile', 'profile_format',
+        'emit', 'tiles', 'tile_size', 'page_size', 'jobs')
+
+class OptionError(Exception):
+    pass
+
+class RequestParser(optparse.OptionParser):
+    def error(self, msg):
+        raise OptionError(msg)
+
+def requestDefaults(options):
+    """ Returns the render options of the server (e.g. --libgvc or
+        --cache-dir) as defaults of requests
+    """
+    defaults = copy.copy(options)
+    for name in REQUEST_ONLY:
+        setattr(defaults, name, suml.optionDefaults()[1][name])
+    return defaults
+
+def parseRequest(path, body, defaults=None):
+    """ Returns (spec, options) from request path query and body, options
+        not given in the query are taken from defaults (see requestDefaults)
+    """
+    spec = body
+    argv = []
+    for key, value in parse_qsl(urlsplit(path).query, keep_blank_values=True):
+        if key == 'spec':
+            spec = value
+        elif value:
+            argv.append('--%s=%s' % (key, value))
+        else:
+            argv.append('--%s' % (key))
+
+    parser = cli.createParser(RequestParser)
+    (options, args) = parser.parse_args(argv)
+    if args or options.serve or options.input_file or options.output_file \
+            or options.batch or options.batch_dir or options.out_dir \
+            or options.cache_dir or options.cache_size or options.stream or options.watch \
+            or options.profile or options.emit or options.tiles or options.tile_size \
+            or options.page_size or options.jobs:
+        raise OptionError('option not allowed in a request')
+    if (options.dpi or 96.0) * (options.scale or 1.0) > MAX_RESOLUTION or \
+            (options.dpi is not None and options.dpi <= 0) or (options.scale is not None and options.scale <= 0):
+        raise OptionError('dpi * scale must be between 0 and %d' % (MAX_RESOLUTION))
+    if not spec:
+        raise OptionError('no spec given')
+    if defaults is not None:
+        (options, args) = parser.parse_args(argv, copy.copy(defaults))
+    return spec.replace('\n', ','), options
+
+def contentType(options):
+    if options.png:
+        return 'image/png'
+    elif options.svg:
+        return 'image/svg+xml'
+    return 'text/plain'
+
+class RenderHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def address_string(self):
+        # unix socket clients don't have an address
+        if isinstance(self.client_address, tuple):
+            return self.client_address[0]
+        return 'unix'
+
+    def log_message(self, format, *args):
+        sys.stderr.write('%s - - [%s] %s\n' % (self.address_string(), self.log_date_time_string(), format % args))
+
+    def do_GET(self):
+        if urlsplit(self.path).path == '/stats':
+            self.stats()
+        else:
+            self.render('')
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length)
+        if not isinstance(body, str):
+            body = body.decode('utf-8')
+        self.render(body)
+
+    def render(self, body):
+        try:
+            spec, options = parseRequest(self.path, body, self.server.defaults)
+        except OptionError as e:
+            self.send_error(400, str(e))
+            return
+
+        fout = io.BytesIO()
+        try:
+            suml.transform(spec, fout, options)
+        except common.SpecError as e:
+            self.send_error(400, str(e))
+            return
+        except Exception:
+            traceback.print_exc()
+            self.send_error(500, str(sys.exc_info()[1]))
+            return
+
+        data = fout.getvalue()
+        self.send_response(200)
+        self.send_header('Content-Type', contentType(options))
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def stats(self):
+        from . import cache
+        fout = io.StringIO() if sys.version_info[0] > 2 else io.BytesIO()
+        store = cache.getCache(self.server.options)
+        if store:
+            store.printStats(fout)
+        data = fout.getvalue()
+        if not isinstance(data, bytes):
+            data = data.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        if data:
+            self.wfile.write(data)
+
+class TCPRenderServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+class UnixRenderServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    daemon_threads = True
+
+def createServer(address, options):
+    """ Creates server for [host:]port or unix socket path address
+
+        Render options (cache, --libgvc, --scruffy, ...) are taken from
+        options as the defaults of all requests.
+    """
+    if os.sep in address:
+        if os.path.exists(address):
+            os.unlink(address)
+        server = UnixRenderServer(address, RenderHandler)
+    else:
+        host, _, port = address.rpartition(':')
+        server = TCPRenderServer((host or '127.0.0.1', int(port)), RenderHandler)
+
+    # pay for imports and loading the font index once, not per request
+    from . import yuml2dot, suml2pic, scruffy, fonts
+    fonts.index()
+    server.options = options
+    server.defaults = requestDefaults(options)
+    # layouts of concurrent requests share dot processes
+    server.defaults.layout_queue = common.LayoutQueue(['dot', '-Tsvg'])
+    return server
+
+def serve(address, options):
+    server = createServer(address, options)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if isinstance(server, UnixRenderServer):
+            os.unlink(address)
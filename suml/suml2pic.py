@@ -26,16 +26,24 @@
 '''
 
 import os
-import xml.etree.ElementTree as etree
+from operator import attrgetter
 from . import common
+from . import fonts
+from . import model
+from . import profile
 
 sequence_pic = os.path.join(os.path.dirname(__file__), 'sequence.pic')
 
 def sumlExpr(spec):
+    return sumlExprChunks([spec])
+
+def sumlExprChunks(chunks):
+    """ Same as sumlExpr for spec given in chunks (e.g. lines of a file) """
     expr = []
-    for part in common.splitYUML(spec):
+    for _, part in common.tokenizeYUMLChunks(chunks):
         if not part: continue
-        if part == ',':
+        # several commas for empty lines
+        if part.strip(', \t\r') == '' and ',' in part:
             if expr: yield expr
             expr = []
 
@@ -54,100 +62,128 @@ def sumlExpr(spec):
 
     if expr: yield expr
 
+# pic2plot's default font size is 0.0175 of the 8in wide display
+FONT_SIZE = 0.14
+
 def getFontWidth():
+    """ Average character width in inches (for fonts without metrics) """
     return 0.13
 
+def getTextWidth(text, options):
+    """ Returns width of text in inches using glyph metrics of options.font if known """
+    width = fonts.textWidth(text, options.font)
+    if width is None:
+        return len(text) * getFontWidth()
+    return width * FONT_SIZE
+
+def addNode(diagram, spec, options):
+    node = diagram.addNode('record', spec.split('|')[0].strip(), spec)
+    if not node.width:
+        node.width = getTextWidth(node.label, options)
+    return node
+
+def exprText(expr):
+    """ Returns expr of sumlExpr written back as spec """
+    return ''.join({'record': '[%s]', '<': '<%s', '>': '%s>'}[kind] % (text) for kind, text in expr)
+
+def addParticipants(diagram, expr, options):
+    """ Adds objects of expr to diagram, returns (sender, receiver, message)
+        for a message or None
+    """
+    if not (len(expr) in (1, 3) and all(kind == 'record' for kind, _ in expr[0::2])
+            and (len(expr) == 1 or expr[1][0] in '<>')):
+        raise common.SpecError('expected [object] or [object]message>[object], got "%s"' % (exprText(expr)))
+    if len(expr) == 1:
+        addNode(diagram, expr[0][1], options)
+        return None
+
+    node1 = addNode(diagram, expr[0][1], options)
+    node2 = addNode(diagram, expr[2][1], options)
+    if expr[1][0] == '<':
+        return node2, node1, expr[1][1]
+    return node1, node2, expr[1][1]
+
+def makeRoom(node1, node2, msg, options):
+    """ Widens the space between node1 and node2 for message msg """
+    msg_width = getTextWidth(msg, options)
+
+    left_node = min(node1, node2, key=attrgetter('id'))
+    right_margin = msg_width - node1.width / 2.0 - node2.width / 2.0
+    if right_margin > left_node.right_margin:
+        left_node.right_margin = right_margin
+
+def addMessage(diagram, node1, node2, msg, options):
+    """ Adds message from node1 to node2, making room for it between them """
+    makeRoom(node1, node2, msg, options)
+    return diagram.addEdge(node1, node2, label=msg)
+
+def sumlDiagram(spec, options):
+    """ Returns model.Diagram for spec, nodes have text widths and messages are edges """
+    diagram = model.Diagram()
+    for expr in sumlExpr(spec):
+        message = addParticipants(diagram, expr, options)
+        if message is not None:
+            addMessage(diagram, message[0], message[1], message[2], options)
+    return diagram
+
+def nodeId(node):
+    return 'A%03d' % (node.id)
+
 def suml2pic(spec, options):
-    boxes = common.Boxes()
-    exprs = list(sumlExpr(spec))
+    with profile.measure(options, 'parse', len(spec)):
+        diagram = sumlDiagram(spec, options)
+
+    with profile.measure(options, 'emit') as record:
+        pic = picSource(diagram)
+        record.bytesOut = len(pic)
+    return pic
+
+def picSource(diagram):
 
     pic = []
     pic.append('.PS')
     pic.append('copy "%s";' % (sequence_pic))
     pic.append('underline=0;')
 
-    messages = []
-    for expr in exprs:
-        assert len(expr) in (1, 3)
-        if len(expr) == 1:
-            assert expr[0][0] == 'record'
-            box = boxes.addBox(expr[0][1])
-            if not box.width:
-                box.width = len(expr[0][1]) * getFontWidth()
-
-        elif len(expr) == 3:
-            assert expr[0][0] == 'record'
-            assert expr[2][0] == 'record'
-
-            box1 = boxes.addBox(expr[0][1])
-            box2 = boxes.addBox(expr[2][1])
-
-            for x in (box1, box2):
-                if not x.width:
-                    x.width = len(x.spec) * getFontWidth()
-
-            msg = expr[1][1]
-            msg_len = len(msg)
-            msg_type = expr[1][0]
-            msg_width = msg_len * getFontWidth()
-
-            left_box = box1
-            if box2.uid < box1.uid:
-                left_box = box2
-            right_margin = msg_width - box1.width / 2.0 - box2.width / 2.0
-            if right_margin > left_box.right_margin:
-                left_box.right_margin = right_margin
-
-            if msg_type == '<':
-                box1, box2 = box2, box1
-
-            messages.append('message(%s,%s,"%s");' % (box1.uid, box2.uid, msg))
-
-    all_boxes = boxes.getBoxes()
-
-    for box in all_boxes:
-        if not box.right_margin:
-            pic.append('object3(%s,"%s",%f);' % (box.uid, box.spec, box.width))
+    for node in diagram.nodes:
+        if not node.right_margin:
+            pic.append('object3(%s,"%s",%f);' % (nodeId(node), node.label, node.width))
         else:
-            pic.append('object3(%s,"%s",%f,%f);' % (box.uid, box.spec, box.width, box.right_margin))
+            pic.append('object3(%s,"%s",%f,%f);' % (nodeId(node), node.label, node.width, node.right_margin))
     pic.append('step();')
-    for box in all_boxes:
-        pic.append('active(%s);' % (box.uid))
+    for node in diagram.nodes:
+        pic.append('active(%s);' % (nodeId(node)))
 
-    pic.extend(messages)
+    for edge in diagram.edges:
+        pic.append('message(%s,%s,"%s");' % (nodeId(diagram.nodes[edge.tail]), nodeId(diagram.nodes[edge.head]), edge.label))
 
     pic.append('step();')
-    for box in all_boxes:
-        pic.append('complete(%s);' % (box.uid))
+    for node in diagram.nodes:
+        pic.append('complete(%s);' % (nodeId(node)))
 
     pic.append('.PE')
     return '\n'.join(pic) + '\n'
 
+def layout(spec, options):
+    """ Returns SVG of sequence diagram drawn without pic2plot """
+    from . import seqsvg
+    with profile.measure(options, 'parse', len(spec)):
+        diagram = sumlDiagram(spec, options)
+
+    with profile.measure(options, 'layout') as record:
+        svg = seqsvg.sequenceSVG(diagram, options)
+        record.bytesOut = len(svg)
+    return svg
+
+def laidOutFunction(expr, options):
+    if getattr(options, 'sequence_renderer', 'native') == 'native':
+        return lambda: layout(expr, options)
+    return None
+
 def transform(expr, fout, options):
-    pic = suml2pic(expr, options)
-
-    if options.png or options.svg:
-        import subprocess
-        import StringIO
-
-        svg = subprocess.Popen(['pic2plot', '-Tsvg'], stdin=subprocess.PIPE, stdout=subprocess.PIPE).communicate(input=pic)[0]
-        
-        etree.register_namespace('', 'http://www.w3.org/2000/svg')
-        root = etree.parse(StringIO.StringIO(svg)).getroot()
-
-        common.clear(root)
-
-        if options.scruffy:
-            import scruffy
-
-            scruffy.transform(root, options)
-        
-        svg = '<?xml version="1.0" encoding="UTF-8" standalone="no" ?>\n' + etree.tostring(root) + '\n'
-        
-        if options.png:
-            png = subprocess.Popen(['convert', '-', '-'], stdin=subprocess.PIPE, stdout=subprocess.PIPE).communicate(input=svg)[0]
-            fout.write(png)
-        elif options.svg:
-            fout.write(svg)
-    else:
-        fout.write(pic)
+    common.transform(expr, 'sequence', lambda: suml2pic(expr, options), ['pic2plot', '-Tsvg'], fout, options,
+            laidOutFunction(expr, options))
+
+def transformMany(expr, outputs, options):
+    common.transformMany(expr, 'sequence', lambda: suml2pic(expr, options), ['pic2plot', '-Tsvg'], outputs, options,
+            laidOutFunction(expr, options))
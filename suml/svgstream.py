@@ -0,0 +1,179 @@
+# Copyright (C) 2011 by Aivars Kalvans <aivars.kalvans@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+# Streaming SVG rewrite: the same as common.rewrite, but the SVG from the
+# layout tool is parsed incrementally and written out as it's transformed.
+#
+# Only the <svg> element and its <g> children (graph0) are kept open. Their
+# children (node and edge groups, or the shapes of flat pic2plot output) are
+# cleared, transformed in batches and written as soon as they are complete,
+# so memory is bounded by the largest of them instead of the whole document.
+# With shadows, bare shapes of a group are held from the first shaded one to
+# the end of the group, so it gets one shadow layer as in the full rewrite.
+# Gradient <defs> are written at the end, after all colors are known.
+
+import xml.etree.ElementTree as etree
+
+from . import scruffy
+
+SVG_NS = scruffy.SVG_NS
+ns = scruffy.ns
+
+BATCH_SIZE = 256 # completed elements transformed together
+
+def escape(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+def escapeAttribute(value):
+    return escape(value).replace('"', '&quot;').replace('\n', '&#10;')
+
+class Writer:
+    """ Serializes elements, the SVG namespace is the default one """
+    def __init__(self, fout):
+        self.fout = fout
+        self.prefixes = {SVG_NS: ''}
+        # namespaces declared on the root element
+        self.declared = set()
+
+    def addNamespace(self, prefix, uri):
+        if uri not in self.prefixes:
+            self.prefixes[uri] = prefix or 'ns%d' % (len(self.prefixes))
+
+    def name(self, tag, declarations):
+        if tag[0] != '{':
+            return tag
+        uri, local = tag[1:].split('}', 1)
+        if uri not in self.declared:
+            # declared below the root, declare it where it's used
+            self.addNamespace(None, uri)
+            if (self.prefixes[uri], uri) not in declarations:
+                declarations.append((self.prefixes[uri], uri))
+        prefix = self.prefixes[uri]
+        return prefix and prefix + ':' + local or local
+
+    def startRoot(self, elem):
+        self.declared.update(self.prefixes)
+        self.start(elem, [(prefix, uri) for uri, prefix in self.prefixes.items()])
+
+    def startTag(self, elem, declarations=()):
+        declarations = list(declarations)
+        tag = self.name(elem.tag, declarations)
+        attributes = ['%s="%s"' % (self.name(key, declarations), escapeAttribute(value))
+                for key, value in elem.attrib.items()]
+        for prefix, uri in declarations:
+            attributes.append('%s="%s"' % (prefix and 'xmlns:' + prefix or 'xmlns', escapeAttribute(uri)))
+        return tag, ''.join(' ' + attribute for attribute in attributes)
+
+    def start(self, elem, declarations=()):
+        tag, attributes = self.startTag(elem, declarations)
+        self.write('<%s%s>\n' % (tag, attributes))
+
+    def end(self, elem):
+        self.write('</%s>\n' % (self.name(elem.tag, [])))
+
+    def element(self, elem):
+        parts = []
+        self.serialize(elem, parts)
+        parts.append('\n')
+        self.write(''.join(parts))
+
+    def serialize(self, elem, parts):
+        tag, attributes = self.startTag(elem)
+        if len(elem) or elem.text:
+            parts.append('<%s%s>' % (tag, attributes))
+            if elem.text:
+                parts.append(escape(elem.text))
+            for child in elem:
+                self.serialize(child, parts)
+                if child.tail:
+                    parts.append(escape(child.tail))
+            parts.append('</%s>' % (tag))
+        else:
+            parts.append('<%s%s />' % (tag, attributes))
+
+    def write(self, text):
+        self.fout.write(text.encode('utf-8'))
+
+def rewrite(fin, fout, options):
+    """ Clears SVG read from fin, processes it with scruffy and writes it to fout """
+    writer = Writer(fout)
+    context = None
+    stack = []
+    batch = []
+    # a shape of flat output shaded into its group's single shadow layer
+    held = [False]
+
+    def flush(parent, level):
+        if not batch:
+            return
+        # transform the batch as the children of a stand-in parent
+        holder = parent.makeelement(parent.tag, parent.attrib)
+        holder.extend(batch)
+        del batch[:]
+        if options.scruffy:
+            shapes = []
+            scruffy._transform(holder, options, shapes, level)
+            scruffy.transformShapes(shapes, options, context)
+        for elem in holder:
+            elem.tail = None
+            writer.element(elem)
+
+    for event, item in etree.iterparse(fin, events=('start-ns', 'start', 'end')):
+        if event == 'start-ns':
+            writer.addNamespace(*item)
+            continue
+
+        if event == 'start':
+            if not stack:
+                writer.write('<?xml version="1.0" encoding="UTF-8" standalone="no" ?>\n')
+                writer.startRoot(item)
+                if options.scruffy:
+                    context = scruffy.createContext(item, options)
+            elif len(stack) == 1 and item.tag == ns('g'):
+                writer.start(item)
+            stack.append(item)
+            continue
+
+        stack.pop()
+        depth = len(stack)
+        if depth == 0:
+            if options.scruffy:
+                writer.element(scruffy.makeDefs(item, context))
+            writer.end(item)
+        elif depth == 1 and item.tag == ns('g'):
+            flush(item, 1)
+            held[0] = False
+            writer.end(item)
+            stack[0].remove(item)
+        elif depth == 1:
+            batch.append(item)
+            flush(stack[0], 0)
+            stack[0].remove(item)
+        elif depth == 2 and stack[1].tag == ns('g'):
+            parent = stack[1]
+            parent.remove(item)
+            # common.clear: the background of the graph
+            if item.tag == ns('polygon') and parent.get('id') == 'graph0':
+                continue
+            batch.append(item)
+            if options.scruffy and options.shadow and item.tag in (ns('polygon'), ns('rect')):
+                held[0] = True
+            if len(batch) >= BATCH_SIZE and not held[0]:
+                flush(parent, 1)
@@ -0,0 +1,269 @@
+# Copyright (C) 2011 by Aivars Kalvans <aivars.kalvans@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+# Tiled PNG output for diagrams too large to rasterize at once: a pyramid of
+# fixed-size tiles per zoom level (DIR/zoom/x/y.png, like map tiles). Only
+# the most detailed level is rasterized from the SVG, in strips of up to
+# STRIP_TILES tiles with a viewBox of just their area, and every other tile
+# is its 4 tiles on the level below downsampled, so no bitmap larger than a
+# strip is ever allocated. The area is cropped to the bounding box of the
+# drawn shapes, computed from the SVG geometry.
+
+import io
+import copy
+import os
+import re
+import json
+import math
+import xml.etree.ElementTree as etree
+
+TILE_SIZE = 256
+# tiles of a row rasterized at once on the most detailed level
+STRIP_TILES = 16
+# around the bounding box, in user units
+MARGIN = 4
+
+SVG = '{http://www.w3.org/2000/svg}'
+_number = re.compile(r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+_transform = re.compile(r'(\w+)\s*\(([^)]*)\)')
+_length = re.compile(r'^\s*([-+]?[\d.]+)\s*(\w*)\s*$')
+
+IDENTITY = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+def multiply(m, n):
+    """ Returns matrix m * n, both as (a, b, c, d, e, f) of SVG matrix() """
+    return (m[0] * n[0] + m[2] * n[1], m[1] * n[0] + m[3] * n[1],
+            m[0] * n[2] + m[2] * n[3], m[1] * n[2] + m[3] * n[3],
+            m[0] * n[4] + m[2] * n[5] + m[4], m[1] * n[4] + m[3] * n[5] + m[5])
+
+def parseTransform(text, matrix=IDENTITY):
+    """ Returns matrix multiplied by SVG transform attribute text """
+    for name, args in _transform.findall(text or ''):
+        values = [float(value) for value in _number.findall(args)]
+        if name == 'matrix' and len(values) == 6:
+            step = tuple(values)
+        elif name == 'translate':
+            step = (1, 0, 0, 1, values[0], values[1] if len(values) > 1 else 0)
+        elif name == 'scale':
+            step = (values[0], 0, 0, values[1] if len(values) > 1 else values[0], 0, 0)
+        elif name == 'rotate':
+            angle = math.radians(values[0])
+            step = (math.cos(angle), math.sin(angle), -math.sin(angle), math.cos(angle), 0, 0)
+            if len(values) == 3:
+                step = multiply(multiply((1, 0, 0, 1, values[1], values[2]), step), (1, 0, 0, 1, -values[1], -values[2]))
+        else:
+            continue
+        matrix = multiply(matrix, step)
+    return matrix
+
+def pairs(text):
+    values = [float(value) for value in _number.findall(text or '')]
+    return zip(values[0::2], values[1::2])
+
+def shapePoints(elem):
+    """ Yields points of the extent of a shape in its own coordinates """
+    tag = elem.tag
+    if tag in (SVG + 'polygon', SVG + 'polyline'):
+        for point in pairs(elem.get('points')):
+            yield point
+    elif tag == SVG + 'path':
+        # dot and pic2plot write absolute commands only, so the numbers
+        # are points and control points (which contain the curves)
+        for point in pairs(elem.get('d')):
+            yield point
+    elif tag in (SVG + 'ellipse', SVG + 'circle'):
+        cx, cy = float(elem.get('cx', 0)), float(elem.get('cy', 0))
+        rx = float(elem.get('rx', elem.get('r', 0)))
+        ry = float(elem.get('ry', elem.get('r', 0)))
+        yield cx - rx, cy - ry
+        yield cx + rx, cy + ry
+    elif tag == SVG + 'rect':
+        x, y = float(elem.get('x', 0)), float(elem.get('y', 0))
+        yield x, y
+        yield x + float(elem.get('width', 0)), y + float(elem.get('height', 0))
+    elif tag == SVG + 'line':
+        yield float(elem.get('x1', 0)), float(elem.get('y1', 0))
+        yield float(elem.get('x2', 0)), float(elem.get('y2', 0))
+    elif tag == SVG + 'text' and elem.text:
+        # no font metrics, an average glyph is about 0.6 em wide
+        size = float(_number.findall(elem.get('font-size', '14'))[0])
+        width = len(elem.text) * size * 0.6
+        x, y = float(elem.get('x', 0)), float(elem.get('y', 0))
+        left = {'middle': x - width / 2, 'end': x - width}.get(elem.get('text-anchor'), x)
+        yield left, y - size
+        yield left + width, y + size * 0.3
+
+def bounds(root):
+    """ Returns (left, top, right, bottom) of all shapes in user units of
+        the root element, None if nothing is drawn
+    """
+    box = [None]
+
+    def visit(elem, matrix):
+        if elem.tag in (SVG + 'defs', SVG + 'title'):
+            return
+        matrix = parseTransform(elem.get('transform'), matrix)
+        for x, y in shapePoints(elem):
+            x, y = matrix[0] * x + matrix[2] * y + matrix[4], matrix[1] * x + matrix[3] * y + matrix[5]
+            if box[0] is None:
+                box[0] = [x, y, x, y]
+            else:
+                b = box[0]
+                b[0], b[1], b[2], b[3] = min(b[0], x), min(b[1], y), max(b[2], x), max(b[3], y)
+        for child in elem:
+            visit(child, matrix)
+
+    visit(root, IDENTITY)
+    return box[0] and tuple(box[0])
+
+def pixels(length, dpi):
+    """ Returns SVG length in pixels at dpi """
+    match = _length.match(length or '')
+    if not match:
+        return None
+    value, unit = float(match.group(1)), match.group(2)
+    return value * {'in': dpi, 'pt': dpi / 72.0, 'pc': dpi / 6.0, 'cm': dpi / 2.54,
+            'mm': dpi / 25.4}.get(unit, 1.0)
+
+def pixelsPerUnit(root, dpi):
+    """ Returns pixels per user unit of SVG root rendered at dpi """
+    viewBox = root.get('viewBox')
+    width = pixels(root.get('width'), dpi)
+    if viewBox and width:
+        return width / float(viewBox.split()[2])
+    return 1.0
+
+class Pyramid:
+    """ Zoom levels of tiles covering area (left, top, right, bottom) in
+        user units at scale pixels per unit on the most detailed level
+    """
+    def __init__(self, area, scale, tileSize=TILE_SIZE):
+        self.area = area
+        self.scale = scale
+        self.tileSize = tileSize
+        self.width = int(math.ceil((area[2] - area[0]) * scale))
+        self.height = int(math.ceil((area[3] - area[1]) * scale))
+        self.maxZoom = max(0, int(math.ceil(math.log(max(self.width, self.height, 1) / float(tileSize), 2))))
+
+    def levelScale(self, zoom):
+        return self.scale / 2.0 ** (self.maxZoom - zoom)
+
+    def grid(self, zoom):
+        """ Returns (columns, rows) of tiles on level zoom """
+        size = self.tileSize / self.levelScale(zoom)
+        columns = int(math.ceil((self.area[2] - self.area[0]) / size))
+        rows = int(math.ceil((self.area[3] - self.area[1]) / size))
+        return max(1, columns), max(1, rows)
+
+    def viewBox(self, zoom, x, y, columns=1):
+        """ Returns viewBox of columns tiles from (x, y) on level zoom """
+        size = self.tileSize / self.levelScale(zoom)
+        return (self.area[0] + x * size, self.area[1] + y * size, columns * size, size)
+
+def tileSVG(head, body, viewBox, width, height):
+    """ Returns SVG document showing viewBox of the document split into root
+        start tag head and body at width x height pixels
+    """
+    head = re.sub(br'\s(width|height|viewBox)="[^"]*"', b'', head)
+    attributes = ' width="%dpx" height="%dpx" viewBox="%f %f %f %f"' % ((width, height) + viewBox)
+    return head[:4] + attributes.encode('ascii') + head[4:] + body
+
+def writePyramid(svg, directory, options):
+    """ Writes tiles of svg into directory/zoom/x/y.png and their layout into
+        directory/tiles.json, returns the Pyramid
+    """
+    import multiprocessing
+    from multiprocessing.pool import ThreadPool
+    from PIL import Image
+    from . import raster
+
+    root = etree.fromstring(svg)
+    box = bounds(root) or (0, 0, 1, 1)
+    area = (box[0] - MARGIN, box[1] - MARGIN, box[2] + MARGIN, box[3] + MARGIN)
+    scale = pixelsPerUnit(root, raster.getDPI(options)) * (options.scale or 1.0)
+    tileSize = options.tile_size or TILE_SIZE
+    pyramid = Pyramid(area, scale, tileSize)
+    del root
+
+    start = svg.index(b'<svg')
+    end = svg.index(b'>', start)
+    head, body = svg[start:end], svg[end:]
+    # tiles are sized in pixels
+    tileOptions = copy.copy(options)
+    tileOptions.dpi = tileOptions.scale = None
+    compression = options.png_compression
+    if compression is None:
+        compression = 6
+
+    def tilePath(zoom, x, y):
+        return os.path.join(directory, str(zoom), str(x), '%d.png' % (y))
+
+    def save(image, zoom, x, y):
+        path = os.path.dirname(tilePath(zoom, x, y))
+        if not os.path.isdir(path):
+            try:
+                os.makedirs(path)
+            except OSError:
+                # made by another thread
+                pass
+        image.save(tilePath(zoom, x, y), 'png', compress_level=compression)
+
+    def renderStrip(strip):
+        # a row of tiles of the most detailed level at once
+        x, y, columns = strip
+        width = columns * tileSize
+        png = raster.rasterize(tileSVG(head, body, pyramid.viewBox(pyramid.maxZoom, x, y, columns),
+                width, tileSize), tileOptions)
+        image = Image.open(io.BytesIO(png)).convert('RGBA')
+        if image.size != (width, tileSize):
+            # rasterizers that don't take px at 96 dpi
+            image = image.resize((width, tileSize), Image.LANCZOS)
+        for column in range(columns):
+            save(image.crop((column * tileSize, 0, (column + 1) * tileSize, tileSize)),
+                    pyramid.maxZoom, x + column, y)
+
+    def renderParent(tile):
+        # the 4 tiles below, downsampled
+        zoom, x, y = tile
+        columns, rows = pyramid.grid(zoom + 1)
+        image = Image.new('RGBA', (2 * tileSize, 2 * tileSize), (255, 255, 255, 0))
+        for dx in (0, 1):
+            for dy in (0, 1):
+                if 2 * x + dx < columns and 2 * y + dy < rows:
+                    child = Image.open(tilePath(zoom + 1, 2 * x + dx, 2 * y + dy))
+                    image.paste(child, (dx * tileSize, dy * tileSize))
+        save(image.resize((tileSize, tileSize), Image.LANCZOS), zoom, x, y)
+
+    columns, rows = pyramid.grid(pyramid.maxZoom)
+    strips = [(x, y, min(STRIP_TILES, columns - x))
+            for y in range(rows) for x in range(0, columns, STRIP_TILES)]
+    pool = ThreadPool(getattr(options, 'jobs', None) or multiprocessing.cpu_count())
+    try:
+        pool.map(renderStrip, strips)
+        for zoom in range(pyramid.maxZoom - 1, -1, -1):
+            columns, rows = pyramid.grid(zoom)
+            pool.map(renderParent, [(zoom, x, y) for x in range(columns) for y in range(rows)], chunksize=4)
+    finally:
+        pool.close()
+
+    with open(os.path.join(directory, 'tiles.json'), 'w') as fout:
+        json.dump({'width': pyramid.width, 'height': pyramid.height, 'tile_size': tileSize,
+                'min_zoom': 0, 'max_zoom': pyramid.maxZoom}, fout, indent=2, sort_keys=True)
+    return pyramid
@@ -0,0 +1,126 @@
+# Copyright (C) 2011 by Aivars Kalvans <aivars.kalvans@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+# Re-renders specs when their files change.
+#
+# Files are polled for new modification times. A changed file is parsed and
+# its expressions are compared with the ones rendered last time, so edits
+# that don't change the diagram (comments, whitespace, empty lines) don't run
+# dot/pic2plot or the rasterizer at all.
+
+import os
+import sys
+import time
+import multiprocessing
+
+from . import batch
+
+POLL_INTERVAL = 0.5 # seconds
+
+def expressions(spec, options):
+    """ Parsed expressions of spec, equal for specs giving the same diagram """
+    if options.sequence:
+        from . import suml2pic
+        return list(suml2pic.sumlExpr(spec))
+    from . import yuml2dot
+    return list(yuml2dot.yumlExpr(spec))
+
+def mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+class ManifestJobs:
+    """ Jobs of a batch manifest, read again whenever the manifest changes """
+    def __init__(self, manifest, out_dir, options):
+        self.manifest = manifest
+        self.out_dir = out_dir
+        self.options = options
+        self.modified = None
+        self.jobs = batch.readManifest(manifest, out_dir, options)
+
+    def __call__(self):
+        modified = mtime(self.manifest)
+        if modified is not None and modified != self.modified:
+            self.modified = modified
+            try:
+                self.jobs = batch.readManifest(self.manifest, self.out_dir, self.options)
+            except (IOError, OSError):
+                # being replaced, keep the last jobs
+                pass
+        return self.jobs
+
+class Watcher:
+    def __init__(self, jobs, options):
+        self.jobs = jobs
+        self.options = options
+        self.mtimes = {}
+        self.exprs = {}
+
+    def poll(self):
+        """ Returns (input, output) jobs whose diagrams changed since the last poll """
+        changed = []
+        seen = set()
+        for job in self.jobs():
+            input_file, output_file = job
+            seen.add(job)
+            modified = mtime(input_file)
+            if modified is None or self.mtimes.get(job) == modified:
+                continue
+            first = job not in self.mtimes
+            self.mtimes[job] = modified
+
+            try:
+                exprs = expressions(batch.readSpec(input_file), self.options)
+            except Exception:
+                # rendering reports the error
+                exprs = None
+
+            output_modified = mtime(output_file)
+            if first:
+                # rendered before watching, unless input is newer
+                unchanged = output_modified is not None and output_modified >= modified
+            else:
+                unchanged = output_modified is not None and exprs is not None \
+                        and self.exprs.get(job) == exprs
+            self.exprs[job] = exprs
+            if not unchanged:
+                changed.append(job)
+
+        # jobs no longer listed
+        for job in list(self.mtimes):
+            if job not in seen:
+                del self.mtimes[job]
+                del self.exprs[job]
+        return changed
+
+def watch(jobs, options, processes=None, interval=POLL_INTERVAL):
+    """ Renders (input, output) jobs returned by jobs() whenever they change, until interrupted """
+    watcher = Watcher(jobs, options)
+    sys.stderr.write('watching for changes, press Ctrl-C to stop\n')
+    try:
+        while True:
+            changed = watcher.poll()
+            if changed:
+                batch.render(changed, options, min(processes or multiprocessing.cpu_count(), len(changed)))
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
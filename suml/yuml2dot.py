@@ -47,9 +47,15 @@ Comment:        // Comments
 
 '''
 
+import io
+import re
+import bisect
 import textwrap
-import common
-import xml.etree.ElementTree as etree
+import subprocess
+import multiprocessing
+from . import common
+from . import model
+from . import profile
 
 def escape_token_escapes(spec):
     return spec.replace('\\[', '\\u005b').replace('\\]', '\\u005d')
@@ -68,10 +74,30 @@ def escape_label(label):
     label = label.replace('\\n\\n', '\\n')
     return label
 
+_escapes = re.compile(r'\\u005[bd]')
+
 def yumlExpr(spec):
+    return yumlExprChunks([spec])
+
+def yumlExprChunks(chunks):
+    """ Same as yumlExpr for spec given in chunks (e.g. lines of a file) """
     expr = []
-    
-    for part in common.splitYUML(escape_token_escapes(spec)):        
+    # offsets of escapes in escaped spec, to report offsets in the original one
+    escapes = []
+
+    def escaped():
+        offset = 0
+        for chunk in chunks:
+            chunk = escape_token_escapes(chunk)
+            escapes.extend(offset + match.start() for match in _escapes.finditer(chunk))
+            offset += len(chunk)
+            yield chunk
+
+    def error(message, part, offset):
+        offset -= 4 * bisect.bisect_left(escapes, offset)
+        return common.SpecError('%s "%s" at offset %d' % (message, unescape_token_escapes(part), offset))
+
+    for offset, part in common.tokenizeYUMLChunks(escaped()):
         if not part: continue
         # End of line, eat multiple empty lines (part is like ',,,,')
         if len(part) > 0 \
@@ -87,9 +113,12 @@ def yumlExpr(spec):
         elif part[0] == '[' and part[-1] == ']':
             part = part[1:-1]
             bg = ''
+            if not part:
+                raise error('empty shape', '[]', offset)
             if part[-1] == '}':
                 x = part.split('{bg:')
-                assert len(x) == 2
+                if len(x) != 2:
+                    raise error('invalid {bg:color} in', '[%s]' % (part), offset)
                 part = x[0]
                 bg = x[1][:-1]
 
@@ -111,7 +140,8 @@ def yumlExpr(spec):
                 style = 'solid'
                 x = part.split('-')
 
-            assert len(x) == 2
+            if len(x) != 2:
+                raise error('invalid relation', part, offset)
             left, right = x
 
             def processLeft(left):
@@ -157,126 +187,261 @@ def recordName(label):
     name = label.split('|')[0].strip()
     return name
 
-def yuml2dot(spec, options):
-    uids = {}
-    class Foo:
-        def __init__(self, label):
-            self.uid = label
-
-    exprs = list(yumlExpr(spec))
-
-    if len(exprs) > 5: options.rankdir = 'TD'
-    else: options.rankdir = 'LR'
-
-    dot = []
-    dot.append('digraph G {')
-    dot.append('    ranksep = 1')
-    dot.append('    rankdir = %s' % (options.rankdir))
-
-    for expr in exprs:
-        for elem in expr:
+def addExpr(diagram, expr):
+    """ Adds expr to diagram, returns (new nodes, new edge or None) """
+    nodes = []
+    for elem in expr:
+        if elem[0] in ('cluster', 'note', 'record'):
+            name = recordName(elem[1])
+            if name in diagram: continue
+            members = ()
             if elem[0] == 'cluster':
-                label = elem[1]
-                if recordName(label) in uids: continue
-                uid = 'cluster_A' + str(len(uids))
-                uids[recordName(label)] = Foo(uid)
+                for node in elem[3]:
+                    if node not in diagram:
+                        raise common.SpecError('unknown member [%s] of cluster [%s]' % (node, name))
+                members = [diagram[node].id for node in elem[3]]
+            nodes.append(diagram.addNode(elem[0], name, elem[1], elem[2], members))
+
+    edge = None
+    if len(expr) == 3 and expr[1][0] == 'edge':
+        elem = expr[1]
+        # Dashed style for notes
+        if expr[0][0] == 'note' or expr[2][0] == 'note':
+            style = 'dashed'
+        else:
+            style = elem[5]
+        count = len(diagram.edges)
+        edge = diagram.addEdge(diagram[recordName(expr[0][1])], diagram[recordName(expr[2][1])],
+                style=style, arrowtail=elem[1], taillabel=elem[2], arrowhead=elem[3], headlabel=elem[4])
+        if len(diagram.edges) == count:
+            # same relation as before
+            edge = None
+    return nodes, edge
+
+def yumlDiagram(spec):
+    """ Returns model.Diagram for spec """
+    diagram = model.Diagram(uniqueEdges=True)
+    for expr in yumlExpr(spec):
+        addExpr(diagram, expr)
+    return diagram
+
+def nodeId(node):
+    if node.kind == 'cluster':
+        return 'cluster_A%d' % (node.id)
+    return 'A%d' % (node.id)
 
-                dot.append('    subgraph %s {' % (uid))
-                dot.append('        label = "%s"' % (label))
-                dot.append('        fontsize = 10')
+def yuml2dot(spec, options):
+    with profile.measure(options, 'parse', len(spec)):
+        exprs = list(yumlExpr(spec))
 
-                if options.font:
-                    dot.append('        fontname = "%s"' % (options.font))
-                for node in elem[3]:
-                    dot.append('        %s' % (uids[node].uid))
-                dot.append('    }')
-            elif elem[0] in ('note', 'record'):
-                label = elem[1]
-                if recordName(label) in uids: continue
-                uid = 'A' + str(len(uids))
-                uids[recordName(label)] = Foo(uid)
-
-                dot.append('    node [')
-                dot.append('        shape = "%s"' % (elem[0]))
-                dot.append('        height = 0.50')
-                #dot.append('        margin = 0.11,0.055')
-                dot.append('        fontsize = 10')
-                if options.font:
-                    dot.append('        fontname = "%s"' % (options.font))
-                dot.append('        margin = "0.20,0.05"')
-                dot.append('    ]')
-                dot.append('    %s [' % (uid))
-
-                # Looks like table / class with attributes and methods
-                if '|' in label:
-                    label = label + '\\n'
-                    label = label.replace('|', '\\n|')
-                else:
-                    lines = []
-                    for line in label.split(';'):
-                        lines.extend(textwrap.wrap(line, 20, break_long_words=False))
-                    label = '\\n'.join(lines)
-
-                label = escape_label(label)
-
-                if '|' in label and options.rankdir == 'TD':
-                    label = '{' + label + '}'
-
-                dot.append('        label = "%s"' % (label))
-                if elem[2]:
-                    dot.append('        style = "filled"')
-                    dot.append('        fillcolor = "%s"' % (elem[2]))
-                dot.append('    ]')
-
-        if len(expr) == 3 and expr[1][0] == 'edge':
-            elem = expr[1]
-            dot.append('    edge [')
-            dot.append('        shape = "%s"' % (elem[0]))
-            dot.append('        dir = "both"')
-            # Dashed style for notes
-            if expr[0][0] == 'note' or expr[2][0] == 'note':
-                dot.append('        style = "dashed"')
-            else:
-                dot.append('        style = "%s"' % (elem[5]))
-            dot.append('        arrowtail = "%s"' % (elem[1]))
-            dot.append('        taillabel = "%s"' % (elem[2]))
-            dot.append('        arrowhead = "%s"' % (elem[3]))
-            dot.append('        headlabel = "%s"' % (elem[4]))
-            dot.append('        labeldistance = 2')
-            dot.append('        fontsize = 10')
-            if options.font:
-                dot.append('        fontname = "%s"' % (options.font))
-            dot.append('    ]')
-            dot.append('    %s -> %s' % (uids[recordName(expr[0][1])].uid, uids[recordName(expr[2][1])].uid))
-
-    dot.append('}')
-    return '\n'.join(dot) + '\n'
-
-def transform(expr, fout, options):
-    dot = yuml2dot(expr, options)
+    with profile.measure(options, 'emit') as record:
+        dot = '\n'.join(dotLines(exprs, options, rankDirection(exprs))) + '\n'
+        record.bytesOut = len(dot)
+    return dot
 
-    if options.png or options.svg:
-        import subprocess
-        import StringIO
+def rankDirection(exprs):
+    """ Returns rankdir for exprs: larger diagrams are laid out top down """
+    return 'TD' if len(exprs) > 5 else 'LR'
 
-        svg = subprocess.Popen(['dot', '-Tsvg'], stdin=subprocess.PIPE, stdout=subprocess.PIPE).communicate(input=dot)[0]
-        
-        etree.register_namespace('', 'http://www.w3.org/2000/svg')
-        root = etree.parse(StringIO.StringIO(svg)).getroot()
-        
-        common.clear(root)
+def headerLines(options, rankdir):
+    yield 'digraph G {'
+    yield '    ranksep = 1'
+    yield '    rankdir = %s' % (rankdir)
+    # graph-wide defaults, elements only override what differs
+    yield '    node [%s]' % (attributeList(NODE_DEFAULTS, options))
+    yield '    edge [%s]' % (attributeList(EDGE_DEFAULTS, options))
 
-        if options.scruffy:
-            import scruffy
+def dotLines(exprs, options, rankdir):
+    """ Yields lines of DOT for exprs as soon as each element is known """
+    diagram = model.Diagram(uniqueEdges=True)
 
-            scruffy.transform(root, options)
+    for line in headerLines(options, rankdir):
+        yield line
 
-        svg = '<?xml version="1.0" encoding="UTF-8" standalone="no" ?>\n' + etree.tostring(root) + '\n'
+    for expr in exprs:
+        nodes, edge = addExpr(diagram, expr)
+        for node in nodes:
+            for line in nodeLines(diagram, node, options, rankdir):
+                yield line
+            # written, only the name and id are needed from now on
+            node.label = node.bg = None
+            node.members = ()
+        if edge is not None:
+            yield edgeLine(diagram, edge)
+
+    yield '}'
+
+def componentSources(exprs, options, rankdir):
+    """ Returns DOT of every connected component of exprs, in the order of
+        their first node. Elements keep their ids and relative order, so a
+        single component gives the same DOT as dotLines.
+    """
+    diagram = model.Diagram(uniqueEdges=True)
+    for expr in exprs:
+        addExpr(diagram, expr)
+    components = diagram.components()
+    component = {}
+    for index, nodes in enumerate(components):
+        for node in nodes:
+            component[node] = index
+
+    sources = [list(headerLines(options, rankdir)) for _ in components]
+    # the same ids are given out again
+    diagram = model.Diagram(uniqueEdges=True)
+    for expr in exprs:
+        nodes, edge = addExpr(diagram, expr)
+        for node in nodes:
+            sources[component[node.id]].extend(nodeLines(diagram, node, options, rankdir))
+        if edge is not None:
+            sources[component[edge.tail]].append(edgeLine(diagram, edge))
+    return ['\n'.join(lines) + '\n}\n' for lines in sources]
+
+def layoutComponents(spec, options):
+    """ Lays out connected components of spec in parallel dot processes,
+        returns SVG with all of them packed together
+    """
+    from multiprocessing.pool import ThreadPool
+    from . import pack
+
+    with profile.measure(options, 'parse', len(spec)):
+        exprs = list(yumlExpr(spec))
+
+    with profile.measure(options, 'emit') as record:
+        sources = [common.toBytes(source) for source in componentSources(exprs, options, rankDirection(exprs))]
+        record.bytesOut = sum(len(source) for source in sources)
+
+    command = ['dot', '-Tsvg']
+    if len(sources) == 1:
+        return common.measuredLayout(command, sources[0], options)
+
+    with profile.measure(options, 'layout', record.bytesOut) as record:
+        pool = ThreadPool(min(len(sources), getattr(options, 'jobs', None) or multiprocessing.cpu_count()))
+        try:
+            # largest first, they take the longest
+            order = sorted(range(len(sources)), key=lambda i: -len(sources[i]))
+            svgs = dict(zip(order, pool.map(lambda i: common.layout(command, sources[i], options), order)))
+        finally:
+            pool.close()
+        svgs = [svgs[i] for i in range(len(sources))]
+        record.bytesOut = sum(len(svg) for svg in svgs)
+
+    with profile.measure(options, 'pack', record.bytesOut) as record:
+        svg = pack.pack(svgs)
+        record.bytesOut = len(svg)
+    return svg
+
+NODE_DEFAULTS = (('shape', '"record"'), ('height', '0.50'), ('fontsize', '10'), ('margin', '"0.20,0.05"'))
+EDGE_DEFAULTS = (('dir', '"both"'), ('style', '"solid"'), ('arrowtail', '"none"'), ('arrowhead', '"none"'),
+        ('labeldistance', '2'), ('fontsize', '10'))
+
+def attributeList(attributes, options=None):
+    attributes = list(attributes)
+    if options is not None and options.font:
+        attributes.append(('fontname', '"%s"' % (options.font)))
+    return ', '.join('%s = %s' % (name, value) for name, value in attributes)
+
+def nodeLines(diagram, node, options, rankdir):
+    label = node.label
+    if node.kind == 'cluster':
+        yield '    subgraph %s {' % (nodeId(node))
+        yield '        label = "%s"' % (label)
+        yield '        fontsize = 10'
+
+        if options.font:
+            yield '        fontname = "%s"' % (options.font)
+        for member in node.members:
+            yield '        %s' % (nodeId(diagram.nodes[member]))
+        yield '    }'
+        return
+
+    # Looks like table / class with attributes and methods
+    if '|' in label:
+        label = label + '\\n'
+        label = label.replace('|', '\\n|')
+    else:
+        lines = []
+        for line in label.split(';'):
+            lines.extend(textwrap.wrap(line, 20, break_long_words=False))
+        label = '\\n'.join(lines)
+
+    label = escape_label(label)
+
+    if '|' in label and rankdir == 'TD':
+        label = '{' + label + '}'
+
+    attributes = []
+    if node.kind != 'record':
+        attributes.append(('shape', '"%s"' % (node.kind)))
+    attributes.append(('label', '"%s"' % (label)))
+    if node.bg:
+        attributes.append(('style', '"filled"'))
+        attributes.append(('fillcolor', '"%s"' % (node.bg)))
+    yield '    %s [%s]' % (nodeId(node), attributeList(attributes))
+
+def edgeLine(diagram, edge):
+    attributes = []
+    if edge.style != 'solid':
+        attributes.append(('style', '"%s"' % (edge.style)))
+    for name in ('arrowtail', 'arrowhead'):
+        if getattr(edge, name) != 'none':
+            attributes.append((name, '"%s"' % (getattr(edge, name))))
+    for name in ('taillabel', 'headlabel'):
+        if getattr(edge, name):
+            attributes.append((name, '"%s"' % (getattr(edge, name))))
+
+    line = '    %s -> %s' % (nodeId(diagram.nodes[edge.tail]), nodeId(diagram.nodes[edge.head]))
+    if attributes:
+        line += ' [%s]' % (attributeList(attributes))
+    return line
+
+def laidOutFunction(expr, options):
+    if getattr(options, 'split_components', False):
+        return lambda: layoutComponents(expr, options)
+    return None
+
+def transform(expr, fout, options, laidOut=None):
+    laidOut = laidOut or laidOutFunction(expr, options)
+    common.transform(expr, 'class', lambda: yuml2dot(expr, options), ['dot', '-Tsvg'], fout, options, laidOut)
+
+def transformMany(expr, outputs, options):
+    common.transformMany(expr, 'class', lambda: yuml2dot(expr, options), ['dot', '-Tsvg'], outputs, options,
+            laidOutFunction(expr, options))
+
+def stream(chunks, fout, options):
+    """ Renders spec given in chunks (e.g. lines of a file) without keeping
+        the whole spec or DOT in memory: DOT statements are written to fout
+        (or to dot) as soon as they are known
+    """
+    # the number of expressions isn't known upfront, assume a large diagram
+    lines = dotLines(yumlExprChunks(chunks), options, 'TD')
 
+    if options.png or options.svg:
+        from . import raster
+
+        process = subprocess.Popen(['dot', '-Tsvg'], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        with profile.measure(options, 'emit') as record:
+            for line in lines:
+                line = common.toBytes(line + '\n')
+                record.bytesOut += len(line)
+                process.stdin.write(line)
+            process.stdin.close()
+
+        # includes waiting for dot
+        with profile.measure(options, 'rewrite'):
+            if options.png:
+                svg = io.BytesIO()
+                common.rewriteStream(process.stdout, svg, options)
+            else:
+                common.rewriteStream(process.stdout, fout, options)
+            process.wait()
         if options.png:
-            png = subprocess.Popen(['convert', '-', '-'], stdin=subprocess.PIPE, stdout=subprocess.PIPE).communicate(input=svg)[0]
+            with profile.measure(options, 'rasterize', len(svg.getvalue())) as record:
+                png = raster.rasterize(svg.getvalue(), options)
+                record.bytesOut = len(png)
             fout.write(png)
-        elif options.svg:
-            fout.write(svg)
     else:
-        fout.write(dot)
+        with profile.measure(options, 'emit') as record:
+            for line in lines:
+                line = common.toBytes(line + '\n')
+                record.bytesOut += len(line)
+                fout.write(line)
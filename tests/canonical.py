@@ -0,0 +1,13 @@
+# Writes SVG from stdin with sorted attributes, so that goldens compare the
+# same whatever order the Python version serializes attributes in.
+
+import sys
+import xml.etree.ElementTree as etree
+
+etree.register_namespace('', 'http://www.w3.org/2000/svg')
+root = etree.parse(sys.stdin).getroot()
+for elem in root.iter():
+    attributes = sorted(elem.attrib.items())
+    elem.attrib.clear()
+    elem.attrib.update(attributes)
+sys.stdout.write(etree.tostring(root).decode('utf-8') + '\n')
@@ -0,0 +1,28 @@
+#!/bin/bash
+
+# Checks that class diagram goldens lay out the same as at another revision
+# (HEAD by default), e.g. after changing how DOT is written:
+#
+#   tests/dotequiv.sh HEAD~1
+#
+# Both versions are rendered with dot -Tsvg and the SVGs are compared.
+
+REV=${1:-HEAD}
+DIR=`dirname $0`
+result=0
+
+for golden in `ls $DIR/class*.dot`;
+do
+    git show $REV:tests/`basename $golden` | dot -Tsvg > $golden.old.svg
+    dot -Tsvg $golden > $golden.new.svg
+    diff $golden.old.svg $golden.new.svg > /dev/null
+    if [ $? -ne 0 ];
+    then
+        result=-1
+        echo "Layout changed for $golden:"
+        diff -up $golden.old.svg $golden.new.svg
+    fi
+    rm -f $golden.old.svg $golden.new.svg
+done
+
+exit $result
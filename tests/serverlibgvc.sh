@@ -0,0 +1,63 @@
+#!/bin/bash
+
+# Checks that a render server started with --libgvc lays out requests in
+# process: dot on the PATH is replaced by a script that only leaves a mark
+# when it's run. Skipped when libgvc isn't installed.
+
+PYTHON=${PYTHON:-python}
+TMP=`mktemp -d`
+trap 'kill $server 2> /dev/null; rm -rf $TMP' EXIT
+
+$PYTHON -c 'import sys; from suml import gvc; sys.exit(gvc.load() is None)' 2> /dev/null
+if [ $? -ne 0 ];
+then
+    echo "libgvc not found, skipping $0"
+    exit 0
+fi
+
+cat > $TMP/dot << EOF
+#!/bin/sh
+touch $TMP/spawned
+exit 1
+EOF
+chmod +x $TMP/dot
+
+PATH=$TMP:$PATH suml --serve $TMP/suml.sock --libgvc 2> $TMP/server.log &
+server=$!
+
+status=`$PYTHON - $TMP/suml.sock << 'EOF'
+import sys
+import time
+import socket
+
+for attempt in range(50):
+    try:
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.connect(sys.argv[1])
+        break
+    except socket.error:
+        time.sleep(0.1)
+client.sendall(b'GET /?svg&spec=[A]->[B] HTTP/1.0\r\n\r\n')
+response = b''
+while True:
+    data = client.recv(65536)
+    if not data:
+        break
+    response += data
+print(response.split(b' ')[1].decode('ascii'))
+EOF`
+
+result=0
+if [ "$status" != "200" ];
+then
+    result=-1
+    echo "Request to the --libgvc server failed with $status:"
+    cat $TMP/server.log
+fi
+if [ -e $TMP/spawned ];
+then
+    result=-1
+    echo "The --libgvc server ran dot"
+fi
+
+exit $result